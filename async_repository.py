@@ -0,0 +1,217 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Set, Tuple, Union
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from models import Persona, PersonaCreate, PersonaUpdate, Pais, PaisCreate, PaisUpdate, Auto, AutoCreate, AutoUpdate, AutoUpsert, Venta, VentaCreate, VentaUpdate, VentaStats
+from dataloader import DataLoader
+from repository import PersonaRepository, PaisRepository, AutoRepository, VentaRepository
+
+
+class AsyncRepository:
+    """Awaitable facade over a sync repository.
+
+    With an AsyncSession the repository code runs through AsyncSession.run_sync, so
+    its queries go through the async driver without blocking the event loop. With a
+    sync Session each call is sent to the thread pool instead.
+
+    Repositories are created per request, so their loader batches and remembers
+    the get_by_id calls of a single request. Writes clear it.
+    """
+
+    repository_class = None
+
+    def __init__(self, session: Union[AsyncSession, Session]):
+        self.session = session
+        sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+        self.repository = self.repository_class(sync_session)
+        # The repositories of a request share its session, which runs one call at a time
+        self.lock = sync_session.info.setdefault("repository_lock", asyncio.Lock())
+        self.loader = DataLoader(self.get_many) if hasattr(self.repository, "get_many") else None
+
+    async def _run(self, method, *args, **kwargs):
+        async with self.lock:
+            if isinstance(self.session, AsyncSession):
+                return await self.session.run_sync(lambda _: method(*args, **kwargs))
+            return await run_in_threadpool(method, *args, **kwargs)
+
+    async def _write(self, method, *args, **kwargs):
+        """Run a write and forget the results the loader remembered"""
+        try:
+            return await self._run(method, *args, **kwargs)
+        finally:
+            if self.loader is not None:
+                self.loader.clear()
+
+    def next_cursor(self, items: list, limit: int) -> Optional[str]:
+        """Cursor pointing after the last item, or None when this was the last page"""
+        return self.repository.next_cursor(items, limit)
+
+
+class AsyncPersonaRepository(AsyncRepository):
+    """Async repository for Persona entity"""
+
+    repository_class = PersonaRepository
+
+    async def create(self, persona: PersonaCreate) -> Persona:
+        return await self._write(self.repository.create, persona)
+
+    async def get_by_id(self, persona_id: int) -> Optional[Persona]:
+        return await self.loader.load(persona_id)
+
+    async def get_many(self, persona_ids: List[int]) -> List[Persona]:
+        return await self._run(self.repository.get_many, persona_ids)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
+        return await self._run(self.repository.get_all, skip, limit, cursor)
+
+    async def update(self, persona_id: int, persona_update: PersonaUpdate) -> Optional[Persona]:
+        return await self._write(self.repository.update, persona_id, persona_update)
+
+    async def delete(self, persona_id: int) -> bool:
+        return await self._write(self.repository.delete, persona_id)
+
+    async def search_by_name(self, nombre: str, skip: int = 0, limit: int = 100) -> List[Persona]:
+        return await self._run(self.repository.search_by_name, nombre, skip, limit)
+
+    async def get_by_id_with_pais(self, persona_id: int) -> Optional[Persona]:
+        return await self._run(self.repository.get_by_id_with_pais, persona_id)
+
+    async def get_all_with_pais(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
+        return await self._run(self.repository.get_all_with_pais, skip, limit, cursor)
+
+
+class AsyncPaisRepository(AsyncRepository):
+    """Async repository for Pais entity"""
+
+    repository_class = PaisRepository
+
+    async def create(self, pais: PaisCreate) -> Pais:
+        return await self._write(self.repository.create, pais)
+
+    async def get_by_id(self, pais_id: int) -> Optional[Pais]:
+        return await self._run(self.repository.get_by_id, pais_id)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Pais]:
+        return await self._run(self.repository.get_all, skip, limit, cursor)
+
+    async def update(self, pais_id: int, pais_update: PaisUpdate) -> Optional[Pais]:
+        return await self._write(self.repository.update, pais_id, pais_update)
+
+    async def delete(self, pais_id: int) -> bool:
+        return await self._write(self.repository.delete, pais_id)
+
+
+class AsyncAutoRepository(AsyncRepository):
+    """Async repository for Auto entity"""
+
+    repository_class = AutoRepository
+
+    async def create(self, auto: AutoCreate) -> Optional[Auto]:
+        return await self._write(self.repository.create, auto)
+
+    async def upsert_by_chasis(self, numero_chasis: str, auto: AutoUpsert) -> Tuple[Auto, bool]:
+        return await self._write(self.repository.upsert_by_chasis, numero_chasis, auto)
+
+    async def get_by_id(self, auto_id: int) -> Optional[Auto]:
+        return await self.loader.load(auto_id)
+
+    async def get_many(self, auto_ids: List[int]) -> List[Auto]:
+        return await self._run(self.repository.get_many, auto_ids)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Auto]:
+        return await self._run(self.repository.get_all, skip, limit, cursor)
+
+    async def update(self, auto_id: int, auto_update: AutoUpdate) -> Optional[Auto]:
+        return await self._write(self.repository.update, auto_id, auto_update)
+
+    async def delete(self, auto_id: int) -> bool:
+        return await self._write(self.repository.delete, auto_id)
+
+    async def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
+        return await self._run(self.repository.get_by_chasis, numero_chasis)
+
+    async def get_by_id_with_ventas(self, auto_id: int) -> Optional[Auto]:
+        return await self._run(self.repository.get_by_id_with_ventas, auto_id)
+
+    async def get_existing_chasis(self, numeros_chasis: List[str]) -> Set[str]:
+        return await self._run(self.repository.get_existing_chasis, numeros_chasis)
+
+    async def get_existing_ids(self, auto_ids: List[int]) -> Set[int]:
+        return await self._run(self.repository.get_existing_ids, auto_ids)
+
+    async def create_many(self, autos: List[AutoCreate]) -> List[Auto]:
+        return await self._write(self.repository.create_many, autos)
+
+    async def search(
+        self,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Auto]:
+        return await self._run(self.repository.search, marca, modelo, skip, limit)
+
+
+class AsyncVentaRepository(AsyncRepository):
+    """Async repository for Venta entity"""
+
+    repository_class = VentaRepository
+
+    async def create(self, venta: VentaCreate) -> Venta:
+        return await self._write(self.repository.create, venta)
+
+    async def get_by_id(self, venta_id: int) -> Optional[Venta]:
+        return await self.loader.load(venta_id)
+
+    async def get_many(self, venta_ids: List[int]) -> List[Venta]:
+        return await self._run(self.repository.get_many, venta_ids)
+
+    async def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Venta]:
+        return await self._run(self.repository.get_all, skip, limit, cursor)
+
+    async def update(self, venta_id: int, venta_update: VentaUpdate) -> Optional[Venta]:
+        return await self._write(self.repository.update, venta_id, venta_update)
+
+    async def delete(self, venta_id: int) -> bool:
+        return await self._write(self.repository.delete, venta_id)
+
+    async def get_by_auto_id(self, auto_id: int) -> List[Venta]:
+        return await self._run(self.repository.get_by_auto_id, auto_id)
+
+    async def get_by_comprador(self, nombre: str) -> List[Venta]:
+        return await self._run(self.repository.get_by_comprador, nombre)
+
+    async def get_by_id_with_auto(self, venta_id: int) -> Optional[Venta]:
+        return await self._run(self.repository.get_by_id_with_auto, venta_id)
+
+    async def create_many(self, ventas: List[VentaCreate]) -> int:
+        return await self._write(self.repository.create_many, ventas)
+
+    async def search(
+        self,
+        nombre_comprador: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None,
+        auto_id: Optional[int] = None,
+        order_by: str = "id",
+        descending: bool = False,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Venta]:
+        return await self._run(
+            self.repository.search,
+            nombre_comprador, precio_min, precio_max, fecha_desde, fecha_hasta,
+            auto_id, order_by, descending, skip, limit
+        )
+
+    async def stats(
+        self,
+        group_by: str,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None
+    ) -> List[VentaStats]:
+        return await self._run(self.repository.stats, group_by, fecha_desde, fecha_hasta)
@@ -1,37 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session
-from typing import List
-from database import get_session
-from models import AutoCreate, AutoUpdate, AutoResponse, AutoResponseWithVentas, VentaResponse
-from repository import AutoRepository, VentaRepository
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, List, Literal, Optional, Union
+from database import get_db_session, stream_rows
+from models import AutoCreate, AutoUpdate, AutoUpsert, AutoResponse, AutoResponseWithVentas, AutoBulkItemError, AutoBulkResponse
+from etag import entity_etag, etag_matches
+from streaming import EXPORT_MEDIA_TYPES, encode_rows
+from pagination import parse_ids
+from responses import AUTO_LIST, AUTO_WITH_VENTAS, json_response
+from repository import AutoRepository
+from async_repository import AsyncAutoRepository
 
 # Create router for autos
 router = APIRouter(prefix="/autos", tags=["autos"])
 
-def get_auto_repository(session: Session = Depends(get_session)) -> AutoRepository:
-    """Dependency to get auto repository"""
-    return AutoRepository(session)
+# Maximum number of autos accepted by POST /autos/bulk
+BULK_MAX_ITEMS = 10000
 
-def get_venta_repository(session: Session = Depends(get_session)) -> VentaRepository:
-    """Dependency to get venta repository"""
-    return VentaRepository(session)
+async def get_auto_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncAutoRepository:
+    """Dependency to get auto repository"""
+    return AsyncAutoRepository(session)
 
 @router.post("/", response_model=AutoResponse, status_code=status.HTTP_201_CREATED)
-def create_auto(
+async def create_auto(
     auto: AutoCreate,
-    repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> AutoResponse:
     """Create a new auto"""
     try:
-        # Check if numero_chasis already exists
-        existing_auto = repo.get_by_chasis(auto.numero_chasis)
-        if existing_auto:
+        # The insert itself detects an existing numero_chasis
+        db_auto = await repo.create(auto)
+        if db_auto is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Auto with numero_chasis '{auto.numero_chasis}' already exists"
             )
-        
-        db_auto = repo.create(auto)
         return AutoResponse.model_validate(db_auto)
     except HTTPException:
         raise
@@ -41,48 +47,133 @@ def create_auto(
             detail=f"Error creating auto: {str(e)}"
         )
 
+@router.post("/bulk", response_model=AutoBulkResponse)
+async def create_autos_bulk(
+    items: List[Any] = Body(..., max_length=BULK_MAX_ITEMS, description="Autos to create"),
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> AutoBulkResponse:
+    """Create many autos at once, reporting rejected items individually"""
+    errors = []
+    candidates = []
+    seen_chasis = set()
+    for index, item in enumerate(items):
+        numero_chasis = item.get("numero_chasis") if isinstance(item, dict) else None
+        try:
+            auto = AutoCreate.model_validate(item)
+        except ValidationError as e:
+            errors.append(AutoBulkItemError(index=index, numero_chasis=numero_chasis, detail=str(e)))
+            continue
+        if auto.numero_chasis in seen_chasis:
+            errors.append(AutoBulkItemError(
+                index=index,
+                numero_chasis=auto.numero_chasis,
+                detail=f"Duplicate numero_chasis '{auto.numero_chasis}' in request"
+            ))
+            continue
+        seen_chasis.add(auto.numero_chasis)
+        candidates.append((index, auto))
+    
+    # One query for every numero_chasis instead of a lookup per item
+    existing = await repo.get_existing_chasis([auto.numero_chasis for _, auto in candidates])
+    autos = []
+    for index, auto in candidates:
+        if auto.numero_chasis in existing:
+            errors.append(AutoBulkItemError(
+                index=index,
+                numero_chasis=auto.numero_chasis,
+                detail=f"Auto with numero_chasis '{auto.numero_chasis}' already exists"
+            ))
+        else:
+            autos.append(auto)
+    
+    try:
+        db_autos = await repo.create_many(autos)
+    except IntegrityError as e:
+        # A concurrent request stored one of the chasis after the check
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Error creating autos, nothing was created: {str(e.orig)}"
+        )
+    
+    errors.sort(key=lambda error: error.index)
+    return AutoBulkResponse(
+        created=[AutoResponse.model_validate(db_auto) for db_auto in db_autos],
+        errors=errors
+    )
+
 @router.get("/", response_model=List[AutoResponse])
-def get_autos(
+async def get_autos(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of autos to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of autos to return"),
-    repo: AutoRepository = Depends(get_auto_repository)
-) -> List[AutoResponse]:
-    """Get all autos with pagination"""
-    autos = repo.get_all(skip=skip, limit=limit)
-    return [AutoResponse.model_validate(auto) for auto in autos]
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor, takes precedence over skip"),
+    ids: Optional[str] = Query(None, description="Comma separated ids fetched in one query, replaces pagination"),
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> Response:
+    """Get all autos with offset or cursor pagination, or the autos with the given ids"""
+    try:
+        if ids is not None:
+            return json_response(AUTO_LIST, await repo.get_many(parse_ids(ids)))
+        autos = await repo.get_all(skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return json_response(AUTO_LIST, autos, request, repo.next_cursor(autos, limit))
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_autos(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    batch_size: int = Query(1000, ge=100, le=10000, description="Rows fetched per round trip")
+) -> StreamingResponse:
+    """Stream every auto as NDJSON or CSV from a server-side cursor"""
+    statement = AutoRepository.export_statement()
+    columns = [column.name for column in statement.selected_columns]
+    return StreamingResponse(
+        encode_rows(stream_rows(statement, batch_size), columns, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="autos.{format}"'}
+    )
 
 @router.get("/{auto_id}", response_model=AutoResponse)
-def get_auto(
+async def get_auto(
     auto_id: int,
-    repo: AutoRepository = Depends(get_auto_repository)
+    request: Request,
+    response: Response,
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> AutoResponse:
-    """Get auto by ID"""
-    db_auto = repo.get_by_id(auto_id)
+    """Get auto by ID, answering 304 when If-None-Match has the current ETag"""
+    db_auto = await repo.get_by_id(auto_id)
     if not db_auto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Auto with id {auto_id} not found"
         )
+    etag = entity_etag(db_auto)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return AutoResponse.model_validate(db_auto)
 
 @router.put("/{auto_id}", response_model=AutoResponse)
-def update_auto(
+async def update_auto(
     auto_id: int,
     auto_update: AutoUpdate,
-    repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> AutoResponse:
     """Update auto by ID"""
     try:
         # Check if numero_chasis already exists (if being updated)
         if auto_update.numero_chasis:
-            existing_auto = repo.get_by_chasis(auto_update.numero_chasis)
+            existing_auto = await repo.get_by_chasis(auto_update.numero_chasis)
             if existing_auto and existing_auto.id != auto_id:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Auto with numero_chasis '{auto_update.numero_chasis}' already exists"
                 )
         
-        db_auto = repo.update(auto_id, auto_update)
+        db_auto = await repo.update(auto_id, auto_update)
         if not db_auto:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -98,12 +189,12 @@ def update_auto(
         )
 
 @router.delete("/{auto_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_auto(
+async def delete_auto(
     auto_id: int,
-    repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> None:
     """Delete auto by ID"""
-    success = repo.delete(auto_id)
+    success = await repo.delete(auto_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -111,12 +202,12 @@ def delete_auto(
         )
 
 @router.get("/chasis/{numero_chasis}", response_model=AutoResponse)
-def get_auto_by_chasis(
+async def get_auto_by_chasis(
     numero_chasis: str,
-    repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> AutoResponse:
     """Get auto by numero_chasis"""
-    db_auto = repo.get_by_chasis(numero_chasis)
+    db_auto = await repo.get_by_chasis(numero_chasis)
     if not db_auto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -124,45 +215,41 @@ def get_auto_by_chasis(
         )
     return AutoResponse.model_validate(db_auto)
 
+@router.put("/chasis/{numero_chasis}", response_model=AutoResponse)
+async def upsert_auto_by_chasis(
+    auto: AutoUpsert,
+    response: Response,
+    numero_chasis: str = Path(..., max_length=50, description="Número de chasis of the auto"),
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> AutoResponse:
+    """Create or replace the auto with numero_chasis, 201 when it was created and 200 otherwise"""
+    db_auto, created = await repo.upsert_by_chasis(numero_chasis, auto)
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return AutoResponse.model_validate(db_auto)
+
 @router.get("/{auto_id}/with-ventas", response_model=AutoResponseWithVentas)
-def get_auto_with_ventas(
+async def get_auto_with_ventas(
     auto_id: int,
-    repo: AutoRepository = Depends(get_auto_repository),
-    venta_repo: VentaRepository = Depends(get_venta_repository)
-) -> AutoResponseWithVentas:
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> Response:
     """Get auto by ID with ventas information included"""
-    db_auto = repo.get_by_id(auto_id)
+    db_auto = await repo.get_by_id_with_ventas(auto_id)
     if not db_auto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Auto with id {auto_id} not found"
         )
-    
-    # Get ventas for this auto
-    ventas = venta_repo.get_by_auto_id(auto_id)
-    
-    auto_dict = AutoResponseWithVentas.model_validate(db_auto).model_dump()
-    auto_dict['ventas'] = [VentaResponse.model_validate(venta).model_dump() for venta in ventas]
-    
-    return AutoResponseWithVentas.model_validate(auto_dict)
+    return json_response(AUTO_WITH_VENTAS, db_auto, from_attributes=True)
 
 @router.get("/search/", response_model=List[AutoResponse])
-def search_autos(
+async def search_autos(
     marca: str = Query(None, min_length=2, description="Marca to search for"),
     modelo: str = Query(None, min_length=2, description="Modelo to search for"),
-    repo: AutoRepository = Depends(get_auto_repository)
-) -> List[AutoResponse]:
-    """Search autos by marca and/or modelo (partial match)"""
-    # This would require additional repository method for search
-    # For now, we'll get all and filter in Python (not efficient for large datasets)
-    all_autos = repo.get_all(limit=1000)
-    filtered_autos = []
-    
-    for auto in all_autos:
-        marca_match = not marca or marca.lower() in auto.marca.lower()
-        modelo_match = not modelo or modelo.lower() in auto.modelo.lower()
-        
-        if marca_match and modelo_match:
-            filtered_autos.append(auto)
-    
-    return [AutoResponse.model_validate(auto) for auto in filtered_autos]
+    skip: int = Query(0, ge=0, description="Number of autos to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of autos to return"),
+    repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> Response:
+    """Search autos by marca and/or modelo (partial match), ranked by relevance"""
+    autos = await repo.search(marca=marca, modelo=modelo, skip=skip, limit=limit)
+    return json_response(AUTO_LIST, autos)
@@ -0,0 +1,76 @@
+"""Compare the old and the one-pass serialization of a 1000-row /ventas/ page.
+
+Run from the repository root:
+
+    python benchmarks/bench_serialization.py [--rows 1000] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import Venta, VentaResponse
+from responses import VENTA_LIST
+
+
+def build_rows(count: int) -> List[Venta]:
+    return [
+        Venta(
+            id=i,
+            nombre_comprador=f"Comprador {i}",
+            precio=1000.5 + i,
+            auto_id=i % 50 + 1,
+            fecha_venta=datetime(2024, 1, 1, 10, 0, i % 60),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def previous_path(rows: List[Venta], response_adapter: TypeAdapter) -> bytes:
+    """model_validate in the route, then FastAPI validating response_model and encoding"""
+    items = [VentaResponse.model_validate(venta) for venta in rows]
+    validated = response_adapter.validate_python(items, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def one_pass(rows: List[Venta]) -> bytes:
+    return VENTA_LIST.dump_json(rows)
+
+
+def measure(function, repeat: int) -> float:
+    """Return the mean time of a call in milliseconds"""
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    response_adapter = TypeAdapter(List[VentaResponse])
+    assert json.loads(previous_path(rows, response_adapter)) == json.loads(one_pass(rows))
+
+    before = measure(lambda: previous_path(rows, response_adapter), args.repeat)
+    after = measure(lambda: one_pass(rows), args.repeat)
+    print(f"{args.rows} ventas per page, mean of {args.repeat} runs")
+    print(f"  model_validate + response_model + json.dumps: {before:8.2f} ms")
+    print(f"  prebuilt TypeAdapter dump_json:               {after:8.2f} ms")
+    print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
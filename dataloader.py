@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class DataLoader:
+    """Coalesces the loads of one request into batched lookups.
+
+    load(key) calls made while other coroutines are still scheduling theirs are
+    answered by a single call to batch_load with every pending key, and each
+    result is remembered until clear() so repeated loads cost nothing. One
+    loader serves one request: it keeps no state between requests.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[Hashable]], Awaitable[List[Any]]],
+        key: Callable[[Any], Hashable] = lambda item: item.id,
+    ):
+        self.batch_load = batch_load
+        self.key = key
+        self.results: Dict[Hashable, "asyncio.Future"] = {}
+        self.pending: List[Hashable] = []
+        # Referenced until done, the event loop only keeps weak references to tasks
+        self._dispatch_task: Optional["asyncio.Task"] = None
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        """Return a future resolving to the item with key, or None if it does not exist"""
+        future = self.results.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.results[key] = future
+        self.pending.append(key)
+        if len(self.pending) == 1:
+            self._dispatch_task = loop.create_task(self._dispatch())
+            self._dispatch_task.add_done_callback(self._dispatch_done)
+        return future
+
+    def _dispatch_done(self, task: "asyncio.Task") -> None:
+        if self._dispatch_task is task:
+            self._dispatch_task = None
+
+    async def _dispatch(self) -> None:
+        # Let the other coroutines of this request queue their keys first
+        await asyncio.sleep(0)
+        keys, self.pending = self.pending, []
+        futures = [self.results[key] for key in keys]
+        try:
+            items = {self.key(item): item for item in await self.batch_load(keys)}
+        except Exception as e:
+            for key, future in zip(keys, futures):
+                # Not remembered, so the next load of the key tries again
+                if self.results.get(key) is future:
+                    del self.results[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in zip(keys, futures):
+            if not future.done():
+                future.set_result(items.get(key))
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        """Forget a remembered result, or all of them, after a write"""
+        if key is None:
+            self.results = {key: future for key, future in self.results.items() if not future.done()}
+        else:
+            future = self.results.get(key)
+            if future is not None and future.done():
+                del self.results[key]
@@ -0,0 +1,231 @@
+import functools
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import get_settings
+
+
+class CacheBackend(ABC):
+    """Storage for cached entities, keyed by strings and holding plain dicts"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: dict) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process LRU cache with a time to live per entry"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "backend": "memory",
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SharedCacheBackend(CacheBackend):
+    """Cache shared between workers through a Redis-compatible client.
+
+    Only get, set with ex and delete are used, so tests can pass any object
+    implementing those three methods. Eviction is left to the store itself.
+    """
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "entity:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(self.prefix + key)
+        with self.lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: dict) -> None:
+        payload = json.dumps(value, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+        self.client.set(self.prefix + key, payload, ex=max(1, int(self.ttl_seconds)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "backend": "shared",
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class EntityCache:
+    """Decorators adding by-id caching to repository methods"""
+
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+
+    @staticmethod
+    def key(model, entity_id: int) -> str:
+        return f"{model.__tablename__}:{entity_id}"
+
+    def cached_get(self, model):
+        """Serve get_by_id(entity_id) from the cache, storing entities loaded on a miss"""
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(repository, entity_id: int):
+                if self.backend is None:
+                    return method(repository, entity_id)
+                data = self.backend.get(self.key(model, entity_id))
+                if data is not None:
+                    # Detached copy: callers that write must load through the session
+                    return model.model_validate(data)
+                entity = method(repository, entity_id)
+                if entity is not None:
+                    self.backend.set(self.key(model, entity_id), entity.model_dump())
+                return entity
+            return wrapper
+        return decorator
+
+    def cached_get_many(self, model):
+        """Serve get_many(entity_ids) from the cache, loading only the missing ids"""
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(repository, entity_ids: List[int]):
+                if self.backend is None:
+                    return method(repository, entity_ids)
+                entity_ids = list(dict.fromkeys(entity_ids))
+                found = {}
+                missing = []
+                for entity_id in entity_ids:
+                    data = self.backend.get(self.key(model, entity_id))
+                    if data is not None:
+                        found[entity_id] = model.model_validate(data)
+                    else:
+                        missing.append(entity_id)
+                for entity in method(repository, missing) if missing else []:
+                    self.backend.set(self.key(model, entity.id), entity.model_dump())
+                    found[entity.id] = entity
+                return [found[entity_id] for entity_id in entity_ids if entity_id in found]
+            return wrapper
+        return decorator
+
+    def write_through(self, model):
+        """Store the entity returned by update(entity_id, ...) once it is committed"""
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(repository, entity_id: int, *args, **kwargs):
+                entity = method(repository, entity_id, *args, **kwargs)
+                if self.backend is not None and entity is not None:
+                    self.backend.set(self.key(model, entity_id), entity.model_dump())
+                return entity
+            return wrapper
+        return decorator
+
+    def invalidate(self, model):
+        """Drop the cached entity after delete(entity_id)"""
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(repository, entity_id: int, *args, **kwargs):
+                result = method(repository, entity_id, *args, **kwargs)
+                self.discard(model, entity_id)
+                return result
+            return wrapper
+        return decorator
+
+    def discard(self, model, entity_id: int) -> None:
+        """Drop a cached entity, for writes that do not go through a decorated method"""
+        if self.backend is not None:
+            self.backend.delete(self.key(model, entity_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats() if self.backend is not None else {"backend": "none"}
+
+
+def create_backend(settings: dict) -> Optional[CacheBackend]:
+    """Build the cache backend selected by ENTITY_CACHE_BACKEND"""
+    backend = settings["entity_cache_backend"]
+    if backend == "none":
+        return None
+    if backend == "redis":
+        # Optional dependency, only needed when the shared backend is selected
+        import redis
+        client = redis.Redis.from_url(settings["entity_cache_url"])
+        return SharedCacheBackend(client, settings["entity_cache_ttl_seconds"])
+    if settings["web_concurrency"] > 1:
+        # Invalidations would only reach the worker that made the write
+        raise ValueError(
+            "ENTITY_CACHE_BACKEND=memory is per worker and serves stale entities with "
+            f"WEB_CONCURRENCY={settings['web_concurrency']}, use redis or none"
+        )
+    return LRUCacheBackend(settings["entity_cache_max_entries"], settings["entity_cache_ttl_seconds"])
+
+
+entity_cache = EntityCache(create_backend(get_settings()))
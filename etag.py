@@ -0,0 +1,21 @@
+import hashlib
+
+from fastapi import Request
+
+
+def entity_etag(entity) -> str:
+    """Strong ETag from the column values of a table entity, without serializing the response"""
+    values = tuple(getattr(entity, column.name) for column in entity.__table__.columns)
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match lists the ETag, using weak comparison as RFC 9110 requires"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
@@ -0,0 +1,178 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.requests import Request
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed bucket upper bounds (in milliseconds)"""
+
+    DEFAULT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets_ms: tuple = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        # One extra slot for observations above the last bound
+        self.counts: List[int] = [0] * (len(buckets_ms) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        index = bisect.bisect_left(self.buckets_ms, value_ms)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_ms += value_ms
+            self.max_ms = max(self.max_ms, value_ms)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counts = list(self.counts)
+            total, sum_ms, max_ms = self.total, self.sum_ms, self.max_ms
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(list(self.buckets_ms) + ["+Inf"], counts):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        return {
+            "count": total,
+            "sum_ms": round(sum_ms, 3),
+            "avg_ms": round(sum_ms / total, 3) if total else 0.0,
+            "max_ms": round(max_ms, 3),
+            "buckets": buckets,
+        }
+
+
+class CheckoutTimingMixin:
+    """Records how long each connection checkout waited on the pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_wait = self.checkout_wait
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkout_wait.observe((time.perf_counter() - start) * 1000)
+
+
+class InstrumentedQueuePool(CheckoutTimingMixin, QueuePool):
+    """QueuePool with checkout wait-time histogram"""
+
+
+class InstrumentedAsyncQueuePool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool with checkout wait-time histogram"""
+
+
+def pool_status(pool) -> dict:
+    """Describe the current state of a connection pool"""
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # Negative while the pool has not opened pool_size connections yet
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+        })
+    if isinstance(pool, CheckoutTimingMixin):
+        status["checkout_wait_ms"] = pool.checkout_wait.snapshot()
+    return status
+
+
+class RequestSqlStats:
+    """SQL statements executed while serving one request"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.duration_ms = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the scope once routing is done
+        route = self.scope.get("route")
+        return getattr(route, "path", self.scope.get("path", ""))
+
+
+request_sql_stats: ContextVar[Optional[RequestSqlStats]] = ContextVar("request_sql_stats", default=None)
+
+slow_query_logger = logging.getLogger("sql.slow")
+
+
+def parameter_shape(parameters: Any) -> Any:
+    """Describe bind parameters by type only, so no values reach the logs"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: one entry per row
+            return {"rows": len(parameters), "row": parameter_shape(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def install_sql_instrumentation(engine: Engine, slow_query_ms: float) -> None:
+    """Time every statement of a sync engine, accumulate it on the current request and log slow ones"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        stats = request_sql_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration_ms += duration_ms
+        if duration_ms >= slow_query_ms:
+            slow_query_logger.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(duration_ms, 3),
+                "route": stats.route if stats is not None else None,
+                "method": stats.scope.get("method") if stats is not None else None,
+                "statement": " ".join(statement.split())[:1000],
+                "parameters": parameter_shape(parameters),
+            }))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+
+async def sql_timing_middleware(request: Request, call_next):
+    """Report per-request SQL statement count and time in the Server-Timing header"""
+    stats = RequestSqlStats(request.scope)
+    token = request_sql_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_sql_stats.reset(token)
+    total_ms = (time.perf_counter() - start) * 1000
+    response.headers.append(
+        "Server-Timing",
+        f'db;dur={stats.duration_ms:.3f};desc="{stats.count} queries", app;dur={total_ms:.3f}'
+    )
+    return response
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from database import engine, get_async_engine, get_settings
+from instrumentation import pool_status
+from entity_cache import entity_cache
+
+# Create router for internal operational endpoints
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+@router.get("/db/pool")
+async def get_db_pool_status() -> dict:
+    """Get connection pool usage and checkout wait-time histograms"""
+    settings = get_settings()
+    result = {
+        "database_mode": settings["database_mode"],
+        "sync": pool_status(engine.pool),
+    }
+    # Only report the async pool once something has created it
+    if get_async_engine.cache_info().currsize:
+        result["async"] = pool_status(get_async_engine().pool)
+    return result
+
+@router.get("/cache")
+async def get_entity_cache_stats() -> dict:
+    """Get hit, miss and eviction counters of the entity cache"""
+    return entity_cache.stats()
@@ -1,28 +1,52 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
-from database import create_db_and_tables
-from objects import objects_router
+from sqlmodel import Session
+from database import engine, get_settings, warm_up_pool
+from migrations import prepare_schema
+from openapi_cache import install as install_openapi_cache
+from ngram_index import persona_name_index
+from pais_cache import pais_cache
+from venta_rollup import venta_rollup
+from objects import object_store, objects_router
 from personas import router as personas_router
 from paises import router as paises_router
 from autos import router as autos_router
 from ventas import router as ventas_router
+from internal import router as internal_router
+from instrumentation import sql_timing_middleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    create_db_and_tables()
+    settings = get_settings()
+    if prepare_schema(engine, settings["schema_startup"]):
+        # Only once the schema is known to be current, see prepare_schema
+        with Session(engine) as session:
+            if not settings["fast_start"]:
+                # Otherwise loaded by the first request that needs them
+                persona_name_index.rebuild(session)
+                pais_cache.rebuild(session)
+            venta_rollup.ensure_built(session)
+    await warm_up_pool(settings["pool_warmup"])
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    object_store.close()
 
 app = FastAPI(
     title="FastAPI CRUD App", 
     description="API with Personas CRUD, Autos CRUD and Ventas CRUD", 
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# Serve the OpenAPI schema from the shared cache file when configured
+if get_settings()["openapi_schema_path"]:
+    install_openapi_cache(app, get_settings()["openapi_schema_path"])
+
 # Include personas router
 app.include_router(personas_router)
 # Include paises router  
@@ -33,6 +57,11 @@ app.include_router(autos_router)
 app.include_router(ventas_router)
 # Include objects router
 app.include_router(objects_router)
+# Include internal router
+app.include_router(internal_router)
+
+# Add SQL timing middleware
+app.middleware("http")(sql_timing_middleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -41,4 +70,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor", "Link", "Server-Timing", "ETag"],  # Pagination, timing and caching headers
 )
@@ -0,0 +1,253 @@
+import argparse
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, NamedTuple
+
+from sqlalchemy import Connection, Engine, func, insert, text
+from sqlmodel import SQLModel, select
+
+from models import SchemaMigration
+
+logger = logging.getLogger("schema.migrations")
+
+# Key of the PostgreSQL advisory lock serializing workers that migrate at once
+MIGRATION_LOCK_ID = 7_303_023
+
+# Startup modes: apply pending migrations, verify the version before serving or
+# in the background, or touch nothing
+STARTUP_MODES = ("migrate", "check", "deferred", "skip")
+
+
+class Migration(NamedTuple):
+    """One schema change, applied once and recorded in schema_migration.
+
+    Non transactional migrations run on an autocommit connection, which
+    CREATE INDEX CONCURRENTLY needs. Every migration must be idempotent: a
+    fresh database gets the current tables from the baseline, and a
+    non transactional migration interrupted halfway runs again.
+    """
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    transactional: bool = True
+
+
+def create_tables(connection: Connection) -> None:
+    """Baseline: the tables as declared in models.py, skipping the existing ones"""
+    SQLModel.metadata.create_all(connection)
+
+
+def create_model_indexes(*names: str) -> Callable[[Connection], None]:
+    """Build indexes declared in models.py, concurrently on PostgreSQL.
+
+    create_all never adds indexes to tables that already exist, so databases
+    created before an index was declared only get it from a migration.
+    """
+    def apply(connection: Connection) -> None:
+        indexes = {index.name: index for table in SQLModel.metadata.tables.values() for index in table.indexes}
+        postgresql = connection.dialect.name == "postgresql"
+        for name in names:
+            index = indexes[name]
+            columns = ", ".join(column.name for column in index.columns)
+            if postgresql:
+                drop_invalid_index(connection, name)
+            connection.execute(text(
+                f"CREATE {'UNIQUE ' if index.unique else ''}INDEX {'CONCURRENTLY ' if postgresql else ''}"
+                f"IF NOT EXISTS {name} ON {index.table.name} ({columns})"
+            ))
+    return apply
+
+
+def drop_invalid_index(connection: Connection, name: str) -> None:
+    """Drop an index left invalid by an interrupted concurrent build, IF NOT EXISTS would keep it"""
+    invalid = connection.execute(
+        text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    ).first()
+    if invalid:
+        logger.warning("Dropping invalid index %s before building it again", name)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+# Trigram indexes backing substring search on autos (PostgreSQL)
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auto_marca_trgm ON auto USING gin (marca gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auto_modelo_trgm ON auto USING gin (modelo gin_trgm_ops)",
+]
+
+# FTS5 trigram table kept in sync with auto through triggers (SQLite fallback)
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE auto_fts USING fts5(marca, modelo, content='auto', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS auto_fts_ai AFTER INSERT ON auto BEGIN
+        INSERT INTO auto_fts(rowid, marca, modelo) VALUES (new.id, new.marca, new.modelo);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS auto_fts_ad AFTER DELETE ON auto BEGIN
+        INSERT INTO auto_fts(auto_fts, rowid, marca, modelo) VALUES ('delete', old.id, old.marca, old.modelo);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS auto_fts_au AFTER UPDATE ON auto BEGIN
+        INSERT INTO auto_fts(auto_fts, rowid, marca, modelo) VALUES ('delete', old.id, old.marca, old.modelo);
+        INSERT INTO auto_fts(rowid, marca, modelo) VALUES (new.id, new.marca, new.modelo);
+    END""",
+    "INSERT INTO auto_fts(auto_fts) VALUES ('rebuild')",
+]
+
+
+def create_search_indexes(connection: Connection) -> None:
+    """Create the dialect specific indexes used by text search"""
+    if connection.dialect.name == "postgresql":
+        for name in ("ix_auto_marca_trgm", "ix_auto_modelo_trgm"):
+            drop_invalid_index(connection, name)
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.execute(text(statement))
+    elif connection.dialect.name == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'auto_fts'")
+        ).first()
+        if not exists:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(text(statement))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline tables", create_tables),
+    Migration(
+        2,
+        "venta and persona lookup indexes",
+        create_model_indexes(
+            "ix_venta_auto_id_precio",
+            "ix_venta_fecha_venta_id",
+            "ix_venta_precio",
+            "ix_persona_pais_id",
+        ),
+        transactional=False,
+    ),
+    Migration(3, "auto text search indexes", create_search_indexes, transactional=False),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection: Connection) -> int:
+    """Return the highest applied version, 0 when schema_migration does not exist yet"""
+    if not connection.dialect.has_table(connection, SchemaMigration.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Serialize workers migrating the same PostgreSQL database at startup"""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    # Autocommit, an open transaction here would block CREATE INDEX CONCURRENTLY
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+
+def migrate(engine: Engine) -> List[Migration]:
+    """Apply the pending migrations in order and return them"""
+    applied = []
+    with migration_lock(engine):
+        with engine.begin() as connection:
+            SchemaMigration.__table__.create(connection, checkfirst=True)
+            version = current_version(connection)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info("Applying migration %s: %s", migration.version, migration.name)
+            if migration.transactional:
+                with engine.begin() as connection:
+                    migration.apply(connection)
+                    record(connection, migration)
+            else:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    migration.apply(connection)
+                    record(connection, migration)
+            applied.append(migration)
+    return applied
+
+
+def record(connection: Connection, migration: Migration) -> None:
+    connection.execute(insert(SchemaMigration).values(version=migration.version, name=migration.name))
+
+
+def check(engine: Engine) -> None:
+    """Fail when the database is behind the migrations of this code"""
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {LATEST_VERSION}: "
+            "run python migrations.py upgrade"
+        )
+
+
+def check_in_background(engine: Engine) -> threading.Thread:
+    """Run check() on a thread, logging a schema behind the code instead of failing startup"""
+    def run() -> None:
+        try:
+            check(engine)
+        except Exception:
+            logger.exception("Deferred schema check failed")
+
+    thread = threading.Thread(target=run, name="schema-check", daemon=True)
+    thread.start()
+    return thread
+
+
+def prepare_schema(engine: Engine, mode: str) -> bool:
+    """Startup schema handling for the SCHEMA_STARTUP mode.
+
+    Returns whether the schema is known to be current, i.e. whether the rest of
+    the startup may query the tables. In deferred and skip modes it must not:
+    on a database that is behind it would fail on a missing table before the
+    version mismatch is reported.
+    """
+    if mode == "migrate":
+        migrate(engine)
+        return True
+    if mode == "check":
+        check(engine)
+        return True
+    if mode == "deferred":
+        check_in_background(engine)
+        return False
+    if mode == "skip":
+        return False
+    raise ValueError(f"SCHEMA_STARTUP must be one of {', '.join(STARTUP_MODES)}, got {mode!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the database schema")
+    parser.add_argument("command", choices=["upgrade", "status"])
+    args = parser.parse_args()
+
+    from database import engine
+    if args.command == "upgrade":
+        applied = migrate(engine)
+        # Startup skips this in the deferred and skip modes, which rely on this command
+        from sqlmodel import Session
+        from venta_rollup import venta_rollup
+        with Session(engine) as session:
+            venta_rollup.ensure_built(session)
+        print(f"Applied {len(applied)} migrations, schema at version {LATEST_VERSION}")
+        return
+    with engine.connect() as connection:
+        version = current_version(connection)
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version <= version else "pending"
+        print(f"{migration.version:4d}  {state:8s}  {migration.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 from sqlmodel import SQLModel, Field, Relationship
-from typing import Optional, List
+from sqlalchemy import Index
+from typing import Optional, List, Union
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 
 class PersonaBase(SQLModel):
     """Base model for Persona"""
     nombre: str = Field(max_length=100, description="Nombre de la persona")
     apellido: str = Field(max_length=100, description="Apellido de la persona")  
     edad: int = Field(ge=0, le=150, description="Edad de la persona")
-    pais_id: Optional[int] = Field(default=None, foreign_key="pais.id", description="ID del país")
+    pais_id: Optional[int] = Field(default=None, foreign_key="pais.id", index=True, description="ID del país")
 
 class Persona(PersonaBase, table=True):
     """Persona table model"""
@@ -88,6 +89,12 @@ class AutoUpdate(BaseModel):
     año: Optional[int] = Field(None, ge=1900, le=2025, description="Año de fabricación")
     numero_chasis: Optional[str] = Field(None, max_length=50, description="Número único de identificación del chasis")
 
+class AutoUpsert(BaseModel):
+    """Model for creating or replacing an auto identified by its numero_chasis"""
+    marca: str = Field(max_length=100, description="Marca del vehículo")
+    modelo: str = Field(max_length=100, description="Modelo específico del vehículo")
+    año: int = Field(ge=1900, le=2025, description="Año de fabricación")
+
 class AutoResponse(AutoBase):
     """Model for auto response"""
     id: int
@@ -96,17 +103,35 @@ class AutoResponseWithVentas(AutoResponse):
     """Model for auto response with ventas information"""
     ventas: List["VentaResponse"] = []
 
+class AutoBulkItemError(BaseModel):
+    """Error for one item of a bulk auto creation"""
+    index: int = Field(description="Position of the item in the request")
+    numero_chasis: Optional[str] = Field(None, description="Número de chasis del item, si pudo leerse")
+    detail: str = Field(description="Reason the item was rejected")
+
+class AutoBulkResponse(BaseModel):
+    """Model for bulk auto creation response"""
+    created: List[AutoResponse] = []
+    errors: List[AutoBulkItemError] = []
+
 
 # Venta models
 class VentaBase(SQLModel):
     """Base model for Venta"""
     nombre_comprador: str = Field(max_length=200, description="Nombre completo del comprador")
-    precio: float = Field(gt=0, description="Precio de venta del vehículo")
+    precio: float = Field(gt=0, index=True, description="Precio de venta del vehículo")
     auto_id: int = Field(foreign_key="auto.id", description="Referencia al auto vendido")
     fecha_venta: datetime = Field(default_factory=datetime.now, description="Fecha y hora de la venta")
 
 class Venta(VentaBase, table=True):
     """Venta table model"""
+    __table_args__ = (
+        # Serves fecha_venta ranges and the (fecha_venta, id) keyset pagination
+        Index("ix_venta_fecha_venta_id", "fecha_venta", "id"),
+        # Serves the venta -> auto join of the stats queries without reading the table
+        Index("ix_venta_auto_id_precio", "auto_id", "precio"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Relationship with auto
@@ -132,4 +157,57 @@ class VentaResponse(VentaBase):
 
 class VentaResponseWithAuto(VentaResponse):
     """Model for venta response with auto information"""
-    auto: Optional["AutoResponse"] = None
\ No newline at end of file
+    auto: Optional["AutoResponse"] = None
+
+class VentaImportError(BaseModel):
+    """Rejected row of a venta import"""
+    line: int = Field(description="Line number in the uploaded file")
+    detail: str = Field(description="Reason the row was rejected")
+
+class VentaImportResponse(BaseModel):
+    """Model for venta import summary"""
+    accepted: int = Field(0, description="Rows stored")
+    rejected: int = Field(0, description="Rows rejected")
+    chunks_committed: int = Field(0, description="Transactions committed")
+    errors: List[VentaImportError] = Field([], description="First rejected rows")
+
+class VentaStats(BaseModel):
+    """Aggregates of precio for one group of ventas"""
+    group: Union[str, int] = Field(description="Value of the grouping column or time bucket")
+    count: int = Field(description="Number of ventas")
+    total: float = Field(description="Sum of precio")
+    average: float = Field(description="Average precio")
+    min: float = Field(description="Lowest precio")
+    max: float = Field(description="Highest precio")
+
+
+# Table versions
+class TableVersion(SQLModel, table=True):
+    """Write counter per table, used by in-process caches to detect changes from other workers"""
+    __tablename__ = "table_version"
+    
+    table_name: str = Field(primary_key=True, max_length=100)
+    version: int = Field(default=0)
+
+
+# Rollups
+class VentaRollupDaily(SQLModel, table=True):
+    """Aggregates of precio per day and marca, maintained by VentaRepository writes"""
+    __tablename__ = "venta_rollup_daily"
+    
+    dia: date = Field(primary_key=True)
+    marca: str = Field(primary_key=True, max_length=100)
+    cantidad: int = Field(default=0)
+    total: float = Field(default=0)
+    precio_min: float
+    precio_max: float
+
+
+# Schema migrations
+class SchemaMigration(SQLModel, table=True):
+    """Migrations applied to the database, see migrations.py"""
+    __tablename__ = "schema_migration"
+    
+    version: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    name: str = Field(max_length=200)
+    applied_at: datetime = Field(default_factory=datetime.now)
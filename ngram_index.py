@@ -0,0 +1,159 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from database import get_settings
+from models import Persona
+from table_cache import VersionedTableCache
+
+
+class NGramIndex:
+    """In-memory n-gram inverted index for substring search over a few text fields.
+
+    Every document is split into lowercase n-grams, and each n-gram maps to the
+    set of document ids containing it. A query is answered by intersecting the
+    posting sets of its n-grams and verifying the candidates, so it never scans
+    documents that cannot match.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], n: int = 2, max_entries: int = 500_000):
+        self.fields = fields
+        self.n = n
+        self.max_entries = max_entries
+        self.documents: Dict[int, dict] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        # True when the index holds every row and can answer searches on its own
+        self.available = False
+        self.lock = threading.Lock()
+
+    def _grams(self, value: str) -> Set[str]:
+        """Return the set of n-grams of a lowercase value"""
+        if len(value) < self.n:
+            return {value} if value else set()
+        return {value[i:i + self.n] for i in range(len(value) - self.n + 1)}
+
+    def _document_grams(self, document: dict) -> Set[str]:
+        grams = set()
+        for field in self.fields:
+            grams |= self._grams(document[field].lower())
+        return grams
+
+    def _add(self, document: dict, documents: Optional[Dict[int, dict]] = None,
+             postings: Optional[Dict[str, Set[int]]] = None) -> None:
+        documents = self.documents if documents is None else documents
+        postings = self.postings if postings is None else postings
+        documents[document["id"]] = document
+        for gram in self._document_grams(document):
+            postings.setdefault(gram, set()).add(document["id"])
+
+    def _remove(self, document_id: int) -> None:
+        document = self.documents.pop(document_id, None)
+        if document is None:
+            return
+        for gram in self._document_grams(document):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(document_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def load(self, documents: Iterable[dict]) -> None:
+        """Replace the whole index content, giving up if it exceeds max_entries.
+
+        The new content is built outside the lock, searches keep using the
+        previous one until it is swapped in.
+        """
+        loaded: Dict[int, dict] = {}
+        postings: Dict[str, Set[int]] = {}
+        available = True
+        for document in documents:
+            if len(loaded) >= self.max_entries:
+                loaded, postings, available = {}, {}, False
+                break
+            self._add(document, loaded, postings)
+        with self.lock:
+            self.documents = loaded
+            self.postings = postings
+            self.available = available
+
+    def upsert(self, document: dict) -> None:
+        """Add or replace a single document"""
+        with self.lock:
+            if not self.available:
+                return
+            self._remove(document["id"])
+            if len(self.documents) >= self.max_entries:
+                # Over budget: drop everything and let searches use the database
+                self.documents = {}
+                self.postings = {}
+                self.available = False
+                return
+            self._add(document)
+
+    def remove(self, document_id: int) -> None:
+        """Remove a single document"""
+        with self.lock:
+            if self.available:
+                self._remove(document_id)
+
+    def search(self, query: str) -> Optional[List[dict]]:
+        """Return the documents with query in any field ordered by id, or None if unavailable"""
+        query = query.lower()
+        with self.lock:
+            if not self.available:
+                return None
+            candidates = None
+            # Rarest posting first keeps the intersections small
+            for gram in sorted(self._grams(query), key=lambda g: len(self.postings.get(g, ()))):
+                ids = self.postings.get(gram)
+                if not ids:
+                    return []
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            if candidates is None:
+                return []
+            return [
+                self.documents[document_id]
+                for document_id in sorted(candidates)
+                if any(query in self.documents[document_id][field].lower() for field in self.fields)
+            ]
+
+
+class PersonaNameIndex(NGramIndex, VersionedTableCache):
+    """N-gram index over persona nombre and apellido kept in sync with the persona table"""
+
+    table_name = "persona"
+
+    def __init__(self, max_entries: int, refresh_seconds: float):
+        NGramIndex.__init__(self, fields=("nombre", "apellido"), max_entries=max_entries)
+        VersionedTableCache.__init__(self, refresh_seconds=refresh_seconds)
+
+    @staticmethod
+    def to_document(persona: Persona) -> dict:
+        return {
+            "id": persona.id,
+            "nombre": persona.nombre,
+            "apellido": persona.apellido,
+            "edad": persona.edad,
+            "pais_id": persona.pais_id,
+        }
+
+    def load_from(self, session: Session) -> None:
+        rows = session.exec(
+            select(Persona.id, Persona.nombre, Persona.apellido, Persona.edad, Persona.pais_id)
+        )
+        self.load(row._asdict() for row in rows)
+
+    def apply_upsert(self, persona: Persona) -> None:
+        self.upsert(self.to_document(persona))
+
+    def apply_delete(self, persona_id: int) -> None:
+        self.remove(persona_id)
+
+
+persona_name_index = PersonaNameIndex(
+    max_entries=get_settings()["persona_index_max_entries"],
+    refresh_seconds=get_settings()["persona_index_refresh_seconds"],
+)
@@ -0,0 +1,363 @@
+import bisect
+import json
+import logging
+import math
+import operator
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger("objects.store")
+
+# Numeric ids per shard: a write copies one shard, never the whole store
+SHARD_SIZE = 4096
+
+# Shard holding the ids that are not numeric, listed before the numeric ones
+TEXT_SHARD = -1
+
+
+class Snapshot(NamedTuple):
+    """Immutable view of the store at one point in time"""
+    shards: Dict[int, Dict[str, dict]]
+    shard_order: tuple
+    count: int
+
+
+# Comparison operators accepted by range filters
+RANGE_OPERATORS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+def shard_of(object_id: str) -> int:
+    return int(object_id) // SHARD_SIZE if object_id.isdigit() else TEXT_SHARD
+
+
+def store_order(obj: dict) -> tuple:
+    """Sort key listing objects in the order of ObjectStore.all()"""
+    return shard_of(obj["id"]), int(obj["id"]) if obj["id"].isdigit() else 0
+
+
+def normalize_key(key: str) -> str:
+    """Keys of data are matched regardless of case and surrounding spaces ("Price" is "price")"""
+    return key.strip().casefold()
+
+
+def numeric_value(value: Any) -> Optional[float]:
+    """Return value as a number, parsing numeric strings such as "419.99", or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return None
+    else:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def equality_token(value: Any) -> Optional[tuple]:
+    """Hashable form of a value for equality: numbers by value, text ignoring case"""
+    number = numeric_value(value)
+    if number is not None:
+        return ("number", number)
+    if isinstance(value, (str, bool)):
+        return ("text", str(value).strip().casefold())
+    return None
+
+
+def data_entries(obj: dict) -> Iterator[Tuple[str, Any]]:
+    for key, value in (obj.get("data") or {}).items():
+        yield normalize_key(key), value
+
+
+class DataIndex:
+    """Secondary indexes over the data of stored objects.
+
+    Hash indexes map (key, equality token) to object ids for equality filters,
+    and per key sorted arrays of numeric values serve range filters. Both are
+    maintained by the store's writers under its lock, and readers copy the
+    candidate ids they need under the index lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.equality: Dict[str, Dict[tuple, Set[str]]] = {}
+        # key -> (sorted values, ids in the same order)
+        self.ranges: Dict[str, Tuple[List[float], List[str]]] = {}
+
+    def load(self, objects: Iterable[dict]) -> None:
+        """Build every index at once, sorting each range index a single time"""
+        pairs: Dict[str, List[Tuple[float, str]]] = {}
+        with self.lock:
+            self.equality = {}
+            for obj in objects:
+                for key, value in data_entries(obj):
+                    token = equality_token(value)
+                    if token is not None:
+                        self.equality.setdefault(key, {}).setdefault(token, set()).add(obj["id"])
+                    number = numeric_value(value)
+                    if number is not None:
+                        pairs.setdefault(key, []).append((number, obj["id"]))
+            self.ranges = {}
+            for key, entries in pairs.items():
+                entries.sort()
+                self.ranges[key] = ([number for number, _ in entries], [object_id for _, object_id in entries])
+
+    def add(self, obj: dict) -> None:
+        with self.lock:
+            for key, value in data_entries(obj):
+                token = equality_token(value)
+                if token is not None:
+                    self.equality.setdefault(key, {}).setdefault(token, set()).add(obj["id"])
+                number = numeric_value(value)
+                if number is not None:
+                    values, ids = self.ranges.setdefault(key, ([], []))
+                    position = bisect.bisect_right(values, number)
+                    values.insert(position, number)
+                    ids.insert(position, obj["id"])
+
+    def remove(self, obj: dict) -> None:
+        with self.lock:
+            for key, value in data_entries(obj):
+                token = equality_token(value)
+                postings = self.equality.get(key, {})
+                if token in postings:
+                    postings[token].discard(obj["id"])
+                    if not postings[token]:
+                        del postings[token]
+                number = numeric_value(value)
+                if number is not None and key in self.ranges:
+                    values, ids = self.ranges[key]
+                    start = bisect.bisect_left(values, number)
+                    end = bisect.bisect_right(values, number)
+                    for position in range(start, end):
+                        if ids[position] == obj["id"]:
+                            del values[position]
+                            del ids[position]
+                            break
+
+    def _range_slice(self, key: str, name: str, bound: float) -> Tuple[List[str], int, int]:
+        values, ids = self.ranges.get(key, ([], []))
+        if name == "gt":
+            return ids, bisect.bisect_right(values, bound), len(ids)
+        if name == "gte":
+            return ids, bisect.bisect_left(values, bound), len(ids)
+        if name == "lt":
+            return ids, 0, bisect.bisect_left(values, bound)
+        return ids, 0, bisect.bisect_right(values, bound)
+
+    def candidates(self, equals: List[Tuple[str, tuple]], ranges: List[Tuple[str, str, float]]) -> Set[str]:
+        """Ids of the objects that may match, read from the most selective index"""
+        with self.lock:
+            best = None
+            for key, token in equals:
+                postings = self.equality.get(key, {}).get(token, ())
+                if best is None or len(postings) < best[1]:
+                    best = (lambda postings=postings: set(postings), len(postings))
+            for key, name, bound in ranges:
+                ids, start, end = self._range_slice(key, name, bound)
+                if best is None or end - start < best[1]:
+                    best = (lambda ids=ids, start=start, end=end: set(ids[start:end]), end - start)
+            return best[0]()
+
+
+def matches(obj: dict, equals: List[Tuple[str, tuple]], ranges: List[Tuple[str, str, float]]) -> bool:
+    """Check every filter against the data of obj"""
+    values: Dict[str, List[Any]] = {}
+    for key, value in data_entries(obj):
+        values.setdefault(key, []).append(value)
+    for key, token in equals:
+        if not any(equality_token(value) == token for value in values.get(key, ())):
+            return False
+    for key, name, bound in ranges:
+        compare = RANGE_OPERATORS[name]
+        numbers = [numeric_value(value) for value in values.get(key, ())]
+        if not any(number is not None and compare(number, bound) for number in numbers):
+            return False
+    return True
+
+
+class ObjectStore:
+    """In-memory object store indexed by id, with optional append-only persistence.
+
+    Readers take the current Snapshot without locking: writers never mutate a
+    published snapshot, they copy the one shard they change (and the small
+    shard map) and swap the new snapshot in under a lock. New ids come from a
+    counter instead of scanning existing ids. A DataIndex over the object data
+    answers attribute queries.
+
+    With log_path every write is appended as a JSON line before it becomes
+    visible, and the log is replayed over the seed objects on startup.
+    """
+
+    def __init__(self, seed: Iterable[dict] = (), log_path: Optional[str] = None, fsync: bool = False):
+        self.log_path = log_path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.log_file = None
+        self.next_id = 1
+        self.snapshot = Snapshot({}, (), 0)
+
+        shards: Dict[int, Dict[str, dict]] = {}
+        for obj in seed:
+            self._load_add(shards, obj)
+        if log_path and os.path.exists(log_path):
+            self._replay(shards, log_path)
+        self.snapshot = Snapshot(shards, tuple(sorted(shards)), sum(len(shard) for shard in shards.values()))
+        self.index = DataIndex()
+        self.index.load(self.all())
+        if log_path:
+            self.log_file = open(log_path, "a", encoding="utf-8")
+            if self._ends_mid_line(log_path):
+                # Terminate a half written last line so new entries stay readable
+                self.log_file.write("\n")
+
+    def _load_add(self, shards: Dict[int, Dict[str, dict]], obj: dict) -> None:
+        shards.setdefault(shard_of(obj["id"]), {})[obj["id"]] = obj
+        if obj["id"].isdigit():
+            self.next_id = max(self.next_id, int(obj["id"]) + 1)
+
+    @staticmethod
+    def _ends_mid_line(log_path: str) -> bool:
+        with open(log_path, "rb") as log:
+            log.seek(0, os.SEEK_END)
+            if log.tell() == 0:
+                return False
+            log.seek(-1, os.SEEK_END)
+            return log.read(1) != b"\n"
+
+    def _replay(self, shards: Dict[int, Dict[str, dict]], log_path: str) -> None:
+        with open(log_path, encoding="utf-8") as log:
+            for number, line in enumerate(log, start=1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line half written
+                    logger.warning("Skipping unreadable line %d of %s", number, log_path)
+                    continue
+                if entry["op"] == "add":
+                    self._load_add(shards, entry["object"])
+                elif entry["op"] == "delete":
+                    shard = shards.get(shard_of(entry["id"]))
+                    if shard is not None:
+                        shard.pop(entry["id"], None)
+
+    def _append(self, entry: dict) -> None:
+        if self.log_file is None:
+            return
+        self.log_file.write(json.dumps(entry) + "\n")
+        self.log_file.flush()
+        if self.fsync:
+            os.fsync(self.log_file.fileno())
+
+    def get(self, object_id: str) -> Optional[dict]:
+        shard = self.snapshot.shards.get(shard_of(object_id))
+        return shard.get(object_id) if shard is not None else None
+
+    def get_many(self, object_ids: List[str]) -> List[dict]:
+        """Return the existing objects among object_ids, in store order"""
+        snapshot = self.snapshot
+        wanted = set(object_ids)
+        found = []
+        for object_id in wanted:
+            shard = snapshot.shards.get(shard_of(object_id))
+            if shard is not None and object_id in shard:
+                found.append(shard[object_id])
+        return sorted(found, key=store_order)
+
+    def query(
+        self,
+        object_ids: Optional[List[str]] = None,
+        equals: Optional[List[Tuple[str, Any]]] = None,
+        ranges: Optional[List[Tuple[str, str, Any]]] = None
+    ) -> List[dict]:
+        """Return the objects matching every filter, in store order.
+
+        equals holds (key, value) pairs, ranges holds (key, operator, bound)
+        with an operator of RANGE_OPERATORS. Keys ignore case, text values
+        compare ignoring case and numeric strings compare as numbers.
+        """
+        equal_filters = []
+        for key, value in equals or []:
+            token = equality_token(value)
+            if token is None:
+                raise ValueError(f"Unsupported value for {key}: {value!r}")
+            equal_filters.append((normalize_key(key), token))
+        range_filters = []
+        for key, name, bound in ranges or []:
+            number = numeric_value(bound)
+            if name not in RANGE_OPERATORS or number is None:
+                raise ValueError(f"Invalid range filter {key} {name} {bound!r}")
+            range_filters.append((normalize_key(key), name, number))
+
+        if not equal_filters and not range_filters:
+            return self.get_many(object_ids) if object_ids is not None else list(self.all())
+
+        candidates = self.index.candidates(equal_filters, range_filters)
+        if object_ids is not None:
+            candidates &= set(object_ids)
+        # Read after the index, so ids removed since then are simply not found
+        snapshot = self.snapshot
+        found = []
+        for object_id in candidates:
+            shard = snapshot.shards.get(shard_of(object_id))
+            obj = shard.get(object_id) if shard is not None else None
+            if obj is not None and matches(obj, equal_filters, range_filters):
+                found.append(obj)
+        return sorted(found, key=store_order)
+
+    def all(self) -> Iterator[dict]:
+        """Iterate over every object of the current snapshot, in id order"""
+        snapshot = self.snapshot
+        for key in snapshot.shard_order:
+            yield from snapshot.shards[key].values()
+
+    def __len__(self) -> int:
+        return self.snapshot.count
+
+    def add(self, name: str, data: Optional[dict]) -> dict:
+        """Store a new object under the next id and return it"""
+        with self.lock:
+            obj = {"id": str(self.next_id), "name": name, "data": data}
+            self._append({"op": "add", "object": obj})
+            self.next_id += 1
+            self._publish(shard_of(obj["id"]), lambda shard: shard.__setitem__(obj["id"], obj), 1)
+            self.index.add(obj)
+            return obj
+
+    def delete(self, object_id: str) -> Optional[dict]:
+        """Remove an object and return it, or None if it does not exist"""
+        with self.lock:
+            obj = self.get(object_id)
+            if obj is None:
+                return None
+            self._append({"op": "delete", "id": object_id})
+            self._publish(shard_of(object_id), lambda shard: shard.pop(object_id), -1)
+            self.index.remove(obj)
+            return obj
+
+    def _publish(self, key: int, change, delta: int) -> None:
+        """Copy shard key, apply change to the copy and swap in the new snapshot"""
+        current = self.snapshot
+        shard = dict(current.shards.get(key, {}))
+        change(shard)
+        shards = dict(current.shards)
+        if shard:
+            shards[key] = shard
+        else:
+            shards.pop(key, None)
+        shard_order = current.shard_order if shards.keys() == current.shards.keys() else tuple(sorted(shards))
+        self.snapshot = Snapshot(shards, shard_order, current.count + delta)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
@@ -1,7 +1,9 @@
 from fastapi import Query, HTTPException, status
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi.routing import APIRouter
 from pydantic import BaseModel
+from database import get_settings
+from object_store import ObjectStore
 
 # Pydantic models for request/response validation
 class ObjectData(BaseModel):
@@ -20,8 +22,8 @@ class ObjectResponse(BaseModel):
     name: str
     data: Optional[Dict[str, Any]] = None
 
-# Global array with objects data
-objects_data = [
+# Objects the store starts from, before replaying its log
+seed_objects = [
     {
         "id": "1",
         "name": "Google Pixel 6 Pro",
@@ -128,26 +130,58 @@ objects_data = [
         }
     }
 ]
-# Create router for personas
+# Indexed store shared by every request, safe to use from the thread pool
+object_store = ObjectStore(
+    seed_objects,
+    log_path=get_settings()["objects_log_path"] or None,
+    fsync=get_settings()["objects_log_fsync"],
+)
+
+# Create router for objects
 objects_router = APIRouter(prefix="/objects", tags=["objects"])
 
+def parse_filters(filters: Optional[List[str]], name: str) -> List[Tuple[str, str]]:
+    """Split "key:value" filters, raising 400 when the separator is missing"""
+    parsed = []
+    for item in filters or []:
+        key, separator, value = item.partition(":")
+        if not separator or not key.strip():
+            raise HTTPException(status_code=400, detail=f"Filter {name} must look like key:value, got '{item}'")
+        parsed.append((key, value))
+    return parsed
+
 @objects_router.get("/objects")
-def get_objects(id: List[str] = Query(None)):
-    """Get objects from the global array, optionally filtered by IDs"""
-    if id is None:
-        # Return all objects if no ID filter is provided
-        return objects_data
-    
-    # Filter objects by the provided IDs
-    filtered_objects = [obj for obj in objects_data if obj["id"] in id]
-    return filtered_objects
+def get_objects(
+    id: List[str] = Query(None),
+    eq: List[str] = Query(None, description="Equality on data as key:value, e.g. color:purple"),
+    gt: List[str] = Query(None, description="Numeric data greater than, e.g. price:100"),
+    gte: List[str] = Query(None, description="Numeric data greater than or equal, as key:number"),
+    lt: List[str] = Query(None, description="Numeric data lower than, as key:number"),
+    lte: List[str] = Query(None, description="Numeric data lower than or equal, as key:number"),
+):
+    """Get objects from the store, optionally filtered by IDs and by their data.
+
+    Data keys and text values ignore case and numeric strings such as "419.99"
+    compare as numbers, so price:419.99 matches both "price" and "Price".
+    """
+    equals = parse_filters(eq, "eq")
+    ranges = [
+        (key, name, value)
+        for name, filters in (("gt", gt), ("gte", gte), ("lt", lt), ("lte", lte))
+        for key, value in parse_filters(filters, name)
+    ]
+    try:
+        # Served by the secondary indexes over data when there are filters
+        return object_store.query(id, equals, ranges)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @objects_router.get("/objects/{object_id}")
 def get_object_by_id(object_id: str):
     """Get a single object by its ID"""
-    for obj in objects_data:
-        if obj["id"] == object_id:
-            return obj
+    obj = object_store.get(object_id)
+    if obj is not None:
+        return obj
     
     # If object not found, raise 404 error
     raise HTTPException(status_code=404, detail=f"Object with id '{object_id}' not found")
@@ -155,29 +189,14 @@ def get_object_by_id(object_id: str):
 @objects_router.post("/objects", status_code=status.HTTP_201_CREATED)
 def add_object(new_object: CreateObjectRequest):
     """Add a new object to the collection"""
-    # Generate new ID (find the highest existing ID and add 1)
-    existing_ids = [int(obj["id"]) for obj in objects_data if obj["id"].isdigit()]
-    new_id = str(max(existing_ids) + 1) if existing_ids else "1"
-    
-    # Create the new object
-    created_object = {
-        "id": new_id,
-        "name": new_object.name,
-        "data": new_object.data
-    }
-    
-    # Add to the global array
-    objects_data.append(created_object)
-    
-    return created_object
+    # The store assigns the next id from its counter
+    return object_store.add(new_object.name, new_object.data)
 
 @objects_router.delete("/objects/{object_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_object(object_id: str):
     """Delete an object by its ID"""
-    for i, obj in enumerate(objects_data):
-        if obj["id"] == object_id:
-            objects_data.pop(i)
-            return
+    if object_store.delete(object_id) is not None:
+        return
     
     # If object not found, raise 404 error
-    raise HTTPException(status_code=404, detail=f"Object with id '{object_id}' not found")
\ No newline at end of file
+    raise HTTPException(status_code=404, detail=f"Object with id '{object_id}' not found")
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import fastapi
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger("openapi.cache")
+
+
+def fingerprint(app: FastAPI) -> str:
+    """Hash of what the schema is built from: the routes, the source of their modules and FastAPI"""
+    digest = hashlib.sha256(f"{fastapi.__version__}|{app.title}|{app.version}|{app.openapi_version}".encode())
+    modules = {"models"}
+    for route in app.routes:
+        digest.update(f"{route.path}|{sorted(getattr(route, 'methods', None) or ())}".encode())
+        if isinstance(route, APIRoute):
+            modules.add(route.endpoint.__module__)
+    for name in sorted(modules):
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path:
+            with open(path, "rb") as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+def load(path: str, expected_fingerprint: str) -> Optional[dict]:
+    """Return the cached schema, None when missing, unreadable or built from other code"""
+    try:
+        with open(path, encoding="utf-8") as cache:
+            cached = json.load(cache)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("fingerprint") != expected_fingerprint:
+        return None
+    return cached.get("schema")
+
+
+def save(path: str, schema_fingerprint: str, schema: dict) -> None:
+    """Write the cache atomically, so concurrent workers never read half a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".openapi-", suffix=".json")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as cache:
+            json.dump({"fingerprint": schema_fingerprint, "schema": schema}, cache)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def install(app: FastAPI, path: str) -> None:
+    """Serve the OpenAPI schema from the file at path instead of building it in every worker.
+
+    The first worker finding the file missing or stale builds the schema and
+    stores it for the next boots; python openapi_cache.py precomputes it at
+    deploy time.
+    """
+    build = app.openapi
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            current = fingerprint(app)
+            schema = load(path, current)
+            if schema is None:
+                schema = build()
+                try:
+                    save(path, current, schema)
+                except OSError as e:
+                    logger.warning("Could not store the OpenAPI schema in %s: %s", path, e)
+            app.openapi_schema = schema
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+def main() -> None:
+    from database import get_settings
+    from main import app
+
+    path = get_settings()["openapi_schema_path"]
+    if not path:
+        sys.exit("Set OPENAPI_SCHEMA_PATH to the file the schema should be written to")
+    save(path, fingerprint(app), app.openapi())
+    print(f"OpenAPI schema written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+from fastapi import Request, Response
+
+# Range of the 64 bit integers the database binds, larger Python ints fail in the driver
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def set_next_cursor(request: Request, response: Response, next_cursor: Optional[str]) -> None:
+    """Expose the cursor of the next page through the X-Next-Cursor and Link headers"""
+    if next_cursor is None:
+        return
+    next_url = request.url.remove_query_params(["skip", "cursor"]).include_query_params(cursor=next_cursor)
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+# Ids accepted by the ?ids= batch fetch of the list routes
+MAX_IDS_PER_REQUEST = 1000
+
+
+def parse_ids(ids: str) -> List[int]:
+    """Parse the comma separated ids of a batch fetch, raising ValueError if they are malformed"""
+    try:
+        values = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError as e:
+        raise ValueError(f"Invalid ids: {ids}") from e
+    if not values:
+        raise ValueError("ids must list at least one id")
+    if any(not INT64_MIN <= value <= INT64_MAX for value in values):
+        raise ValueError(f"Invalid ids: {ids}")
+    if len(values) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_IDS_PER_REQUEST} ids can be fetched at once")
+    return values
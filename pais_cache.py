@@ -0,0 +1,42 @@
+import threading
+from typing import Dict, Optional
+
+from sqlmodel import Session, select
+
+from database import get_settings
+from models import Pais
+from table_cache import VersionedTableCache
+
+
+class PaisCache(VersionedTableCache):
+    """Fully materialized in-process copy of the pais reference table"""
+
+    table_name = "pais"
+
+    def __init__(self, refresh_seconds: float):
+        super().__init__(refresh_seconds=refresh_seconds)
+        self.paises: Dict[int, dict] = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load_from(self, session: Session) -> None:
+        rows = session.exec(select(Pais.id, Pais.nombre)).all()
+        with self.lock:
+            self.paises = {row.id: row._asdict() for row in rows}
+            self.loaded = True
+
+    def apply_upsert(self, pais: Pais) -> None:
+        with self.lock:
+            self.paises[pais.id] = {"id": pais.id, "nombre": pais.nombre}
+
+    def apply_delete(self, pais_id: int) -> None:
+        with self.lock:
+            self.paises.pop(pais_id, None)
+
+    def get(self, pais_id: int) -> Optional[Pais]:
+        """Return a detached copy of the cached pais, or None if it does not exist"""
+        data = self.paises.get(pais_id)
+        return Pais(**data) if data is not None else None
+
+
+pais_cache = PaisCache(refresh_seconds=get_settings()["pais_cache_refresh_seconds"])
@@ -1,25 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlmodel import Session
-from typing import List
-from database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional, Union
+from database import get_db_session
 from models import Pais, PaisCreate, PaisUpdate, PaisResponse
-from repository import PaisRepository
+from responses import PAIS_LIST, json_response
+from async_repository import AsyncPaisRepository
 
 # Create router for paises
 router = APIRouter(prefix="/paises", tags=["paises"])
 
-def get_pais_repository(session: Session = Depends(get_session)) -> PaisRepository:
+async def get_pais_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncPaisRepository:
     """Dependency to get pais repository"""
-    return PaisRepository(session)
+    return AsyncPaisRepository(session)
 
 @router.post("/", response_model=PaisResponse, status_code=status.HTTP_201_CREATED)
-def create_pais(
+async def create_pais(
     pais: PaisCreate,
-    repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> PaisResponse:
     """Create a new pais"""
     try:
-        db_pais = repo.create(pais)
+        db_pais = await repo.create(pais)
         return PaisResponse.model_validate(db_pais)
     except Exception as e:
         raise HTTPException(
@@ -28,22 +30,30 @@ def create_pais(
         )
 
 @router.get("/", response_model=List[PaisResponse])
-def get_paises(
+async def get_paises(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of paises to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of paises to return"),
-    repo: PaisRepository = Depends(get_pais_repository)
-) -> List[PaisResponse]:
-    """Get all paises with pagination"""
-    paises = repo.get_all(skip=skip, limit=limit)
-    return [PaisResponse.model_validate(pais) for pais in paises]
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor, takes precedence over skip"),
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
+) -> Response:
+    """Get all paises with offset or cursor pagination"""
+    try:
+        paises = await repo.get_all(skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return json_response(PAIS_LIST, paises, request, repo.next_cursor(paises, limit))
 
 @router.get("/{pais_id}", response_model=PaisResponse)
-def get_pais(
+async def get_pais(
     pais_id: int,
-    repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> PaisResponse:
     """Get pais by ID"""
-    db_pais = repo.get_by_id(pais_id)
+    db_pais = await repo.get_by_id(pais_id)
     if not db_pais:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -52,13 +62,13 @@ def get_pais(
     return PaisResponse.model_validate(db_pais)
 
 @router.put("/{pais_id}", response_model=PaisResponse)
-def update_pais(
+async def update_pais(
     pais_id: int,
     pais_update: PaisUpdate,
-    repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> PaisResponse:
     """Update pais by ID"""
-    db_pais = repo.update(pais_id, pais_update)
+    db_pais = await repo.update(pais_id, pais_update)
     if not db_pais:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -67,12 +77,12 @@ def update_pais(
     return PaisResponse.model_validate(db_pais)
 
 @router.delete("/{pais_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_pais(
+async def delete_pais(
     pais_id: int,
-    repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> None:
     """Delete pais by ID"""
-    success = repo.delete(pais_id)
+    success = await repo.delete(pais_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -80,16 +90,16 @@ def delete_pais(
         )
 
 @router.get("/search/", response_model=List[PaisResponse])
-def search_paises_by_name(
+async def search_paises_by_name(
     nombre: str = Query(..., min_length=2, description="Name to search for"),
-    repo: PaisRepository = Depends(get_pais_repository)
-) -> List[PaisResponse]:
+    repo: AsyncPaisRepository = Depends(get_pais_repository)
+) -> Response:
     """Search paises by name (partial match)"""
     # This would require additional repository method for search
     # For now, we'll get all and filter in Python (not efficient for large datasets)
-    all_paises = repo.get_all(limit=1000)
+    all_paises = await repo.get_all(limit=1000)
     filtered_paises = [
         pais for pais in all_paises 
         if nombre.lower() in pais.nombre.lower()
     ]
-    return [PaisResponse.model_validate(pais) for pais in filtered_paises]
+    return json_response(PAIS_LIST, filtered_paises)
@@ -1,39 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlmodel import Session
-from typing import List
-from database import get_session
-from models import PersonaCreate, PersonaUpdate, PersonaResponse, PersonaResponseWithPais, PaisResponse
-from repository import PersonaRepository, PaisRepository
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional, Union
+from database import get_db_session
+from models import PersonaCreate, PersonaUpdate, PersonaResponse, PersonaResponseWithPais
+from etag import entity_etag, etag_matches
+from pagination import parse_ids
+from responses import PERSONA_LIST, PERSONA_WITH_PAIS_LIST, json_response
+from async_repository import AsyncPersonaRepository, AsyncPaisRepository
 
 # Create router for personas
 router = APIRouter(prefix="/personas", tags=["personas"])
 
-def get_persona_repository(session: Session = Depends(get_session)) -> PersonaRepository:
+async def get_persona_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncPersonaRepository:
     """Dependency to get persona repository"""
-    return PersonaRepository(session)
+    return AsyncPersonaRepository(session)
 
-def get_pais_repository(session: Session = Depends(get_session)) -> PaisRepository:
+async def get_pais_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncPaisRepository:
     """Dependency to get pais repository"""
-    return PaisRepository(session)
+    return AsyncPaisRepository(session)
 
 @router.post("/", response_model=PersonaResponse, status_code=status.HTTP_201_CREATED)
-def create_persona(
+async def create_persona(
     persona: PersonaCreate,
-    repo: PersonaRepository = Depends(get_persona_repository),
-    pais_repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPersonaRepository = Depends(get_persona_repository),
+    pais_repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> PersonaResponse:
     """Create a new persona"""
     try:
         # Validate that pais exists if provided
         if persona.pais_id is not None:
-            db_pais = pais_repo.get_by_id(persona.pais_id)
+            db_pais = await pais_repo.get_by_id(persona.pais_id)
             if not db_pais:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Pais with id {persona.pais_id} not found"
                 )
         
-        db_persona = repo.create(persona)
+        db_persona = await repo.create(persona)
         return PersonaResponse.model_validate(db_persona)
     except HTTPException:
         raise
@@ -44,48 +48,65 @@ def create_persona(
         )
 
 @router.get("/", response_model=List[PersonaResponse])
-def get_personas(
+async def get_personas(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of personas to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of personas to return"),
-    repo: PersonaRepository = Depends(get_persona_repository)
-) -> List[PersonaResponse]:
-    """Get all personas with pagination"""
-    personas = repo.get_all(skip=skip, limit=limit)
-    return [PersonaResponse.model_validate(persona) for persona in personas]
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor, takes precedence over skip"),
+    ids: Optional[str] = Query(None, description="Comma separated ids fetched in one query, replaces pagination"),
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
+) -> Response:
+    """Get all personas with offset or cursor pagination, or the personas with the given ids"""
+    try:
+        if ids is not None:
+            return json_response(PERSONA_LIST, await repo.get_many(parse_ids(ids)))
+        personas = await repo.get_all(skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return json_response(PERSONA_LIST, personas, request, repo.next_cursor(personas, limit))
 
 @router.get("/{persona_id}", response_model=PersonaResponse)
-def get_persona(
+async def get_persona(
     persona_id: int,
-    repo: PersonaRepository = Depends(get_persona_repository)
+    request: Request,
+    response: Response,
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
 ) -> PersonaResponse:
-    """Get persona by ID"""
-    db_persona = repo.get_by_id(persona_id)
+    """Get persona by ID, answering 304 when If-None-Match has the current ETag"""
+    db_persona = await repo.get_by_id(persona_id)
     if not db_persona:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Persona with id {persona_id} not found"
         )
+    etag = entity_etag(db_persona)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return PersonaResponse.model_validate(db_persona)
 
 @router.put("/{persona_id}", response_model=PersonaResponse)
-def update_persona(
+async def update_persona(
     persona_id: int,
     persona_update: PersonaUpdate,
-    repo: PersonaRepository = Depends(get_persona_repository),
-    pais_repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPersonaRepository = Depends(get_persona_repository),
+    pais_repo: AsyncPaisRepository = Depends(get_pais_repository)
 ) -> PersonaResponse:
     """Update persona by ID"""
     try:
         # Validate that pais exists if provided
         if persona_update.pais_id is not None:
-            db_pais = pais_repo.get_by_id(persona_update.pais_id)
+            db_pais = await pais_repo.get_by_id(persona_update.pais_id)
             if not db_pais:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Pais with id {persona_update.pais_id} not found"
                 )
         
-        db_persona = repo.update(persona_id, persona_update)
+        db_persona = await repo.update(persona_id, persona_update)
         if not db_persona:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -101,12 +122,12 @@ def update_persona(
         )
 
 @router.delete("/{persona_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_persona(
+async def delete_persona(
     persona_id: int,
-    repo: PersonaRepository = Depends(get_persona_repository)
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
 ) -> None:
     """Delete persona by ID"""
-    success = repo.delete(persona_id)
+    success = await repo.delete(persona_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -114,64 +135,44 @@ def delete_persona(
         )
 
 @router.get("/with-pais/", response_model=List[PersonaResponseWithPais])
-def get_personas_with_pais(
+async def get_personas_with_pais(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of personas to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of personas to return"),
-    repo: PersonaRepository = Depends(get_persona_repository),
-    pais_repo: PaisRepository = Depends(get_pais_repository)
-) -> List[PersonaResponseWithPais]:
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor, takes precedence over skip"),
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
+) -> Response:
     """Get all personas with their pais information included"""
-    personas = repo.get_all(skip=skip, limit=limit)
-    result = []
-    
-    for persona in personas:
-        persona_dict = PersonaResponseWithPais.model_validate(persona).model_dump()
-        
-        # Load pais information if pais_id exists
-        if persona.pais_id:
-            db_pais = pais_repo.get_by_id(persona.pais_id)
-            if db_pais:
-                persona_dict['pais'] = PaisResponse.model_validate(db_pais).model_dump()
-        
-        result.append(PersonaResponseWithPais.model_validate(persona_dict))
-    
-    return result
+    try:
+        personas = await repo.get_all_with_pais(skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return json_response(PERSONA_WITH_PAIS_LIST, personas, request, repo.next_cursor(personas, limit), from_attributes=True)
 
 @router.get("/{persona_id}/with-pais", response_model=PersonaResponseWithPais)
-def get_persona_with_pais(
+async def get_persona_with_pais(
     persona_id: int,
-    repo: PersonaRepository = Depends(get_persona_repository),
-    pais_repo: PaisRepository = Depends(get_pais_repository)
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
 ) -> PersonaResponseWithPais:
     """Get persona by ID with pais information included"""
-    db_persona = repo.get_by_id(persona_id)
+    db_persona = await repo.get_by_id_with_pais(persona_id)
     if not db_persona:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Persona with id {persona_id} not found"
         )
-    
-    persona_dict = PersonaResponseWithPais.model_validate(db_persona).model_dump()
-    
-    # Load pais information if pais_id exists
-    if db_persona.pais_id:
-        db_pais = pais_repo.get_by_id(db_persona.pais_id)
-        if db_pais:
-            persona_dict['pais'] = PaisResponse.model_validate(db_pais).model_dump()
-    
-    return PersonaResponseWithPais.model_validate(persona_dict)
+    return PersonaResponseWithPais.model_validate(db_persona)
 
 @router.get("/search/", response_model=List[PersonaResponse])
-def search_personas_by_name(
+async def search_personas_by_name(
     nombre: str = Query(..., min_length=2, description="Name to search for"),
-    repo: PersonaRepository = Depends(get_persona_repository)
-) -> List[PersonaResponse]:
+    skip: int = Query(0, ge=0, description="Number of personas to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of personas to return"),
+    repo: AsyncPersonaRepository = Depends(get_persona_repository)
+) -> Response:
     """Search personas by name (partial match)"""
-    # This would require additional repository method for search
-    # For now, we'll get all and filter in Python (not efficient for large datasets)
-    all_personas = repo.get_all(limit=1000)
-    filtered_personas = [
-        persona for persona in all_personas 
-        if nombre.lower() in persona.nombre.lower() or nombre.lower() in persona.apellido.lower()
-    ]
-    return [PersonaResponse.model_validate(persona) for persona in filtered_personas]
+    personas = await repo.search_by_name(nombre, skip=skip, limit=limit)
+    return json_response(PERSONA_LIST, personas)
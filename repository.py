@@ -1,7 +1,153 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from sqlmodel import Session, select
-from models import Persona, PersonaCreate, PersonaUpdate, Pais, PaisCreate, PaisUpdate, Auto, AutoCreate, AutoUpdate, Venta, VentaCreate, VentaUpdate
+from typing import Any, List, Optional, Set, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+from sqlmodel import Session, select, and_, or_, func
+from sqlalchemy import table, column, insert, update, delete, tuple_, literal_column
+from sqlalchemy.orm import joinedload, selectinload
+from models import Persona, PersonaCreate, PersonaUpdate, Pais, PaisCreate, PaisUpdate, Auto, AutoCreate, AutoUpdate, AutoUpsert, Venta, VentaCreate, VentaUpdate, VentaStats, VentaRollupDaily, TableVersion
+from database import dialect_insert
+from ngram_index import persona_name_index
+from pais_cache import pais_cache
+from entity_cache import entity_cache
+from venta_rollup import venta_rollup
+from pagination import INT64_MAX, INT64_MIN, encode_cursor, decode_cursor
+
+# Values per IN (...) query, well below the bind parameter limits of SQLite and PostgreSQL
+IN_CLAUSE_CHUNK_SIZE = 5000
+
+
+def bump_table_version(session: Session, table_name: str) -> int:
+    """Increment the write counter of a table inside the current transaction and return it"""
+    version = session.execute(
+        update(TableVersion)
+        .where(TableVersion.table_name == table_name)
+        .values(version=TableVersion.version + 1)
+        .returning(TableVersion.version)
+    ).scalar()
+    if version is None:
+        session.add(TableVersion(table_name=table_name, version=1))
+        session.flush()
+        version = 1
+    return version
+
+
+def select_by_ids(session: Session, model, ids: List[int]) -> list:
+    """Load the rows of model with the given ids through chunked IN queries, in the order of ids"""
+    ids = list(dict.fromkeys(ids))
+    found = {}
+    for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+        for entity in session.exec(select(model).where(model.id.in_(chunk))):
+            found[entity.id] = entity
+    return [found[entity_id] for entity_id in ids if entity_id in found]
+
+
+class ReturningWritesMixin:
+    """Single-statement writes on the table of model, reading the row back through RETURNING.
+    
+    Entities are built from the returned columns instead of being refreshed
+    after commit, so they are not attached to the session.
+    """
+    
+    model = None
+    
+    def _insert_returning(self, values: dict):
+        """INSERT one row and return it as an entity"""
+        table = self.model.__table__
+        row = self.session.execute(insert(table).values(**values).returning(*table.columns)).one()
+        return self.model(**row._mapping)
+    
+    def _update_returning(self, entity_id: int, values: dict, previous: tuple = ()):
+        """UPDATE one row by id and return (entity, previous values), or None if it does not exist.
+        
+        previous names columns whose values before the update are also needed.
+        PostgreSQL reads them in the same statement through UPDATE ... FROM the
+        table itself; SQLite returns only the new values, so it selects them first.
+        """
+        table = self.model.__table__
+        old_values = {}
+        if previous and (not values or self.session.get_bind().dialect.name != "postgresql"):
+            row = self.session.execute(
+                select(*[table.c[name] for name in previous]).where(table.c.id == entity_id)
+            ).first()
+            if row is None:
+                return None
+            old_values = row._asdict()
+        
+        if not values:
+            row = self.session.execute(select(*table.columns).where(table.c.id == entity_id)).first()
+            return (self.model(**row._mapping), old_values) if row is not None else None
+        
+        statement = update(table).where(table.c.id == entity_id).values(**values)
+        returning = list(table.columns)
+        if previous and not old_values:
+            old = table.alias("previous")
+            statement = statement.where(old.c.id == table.c.id)
+            returning += [old.c[name].label(f"previous_{name}") for name in previous]
+        row = self.session.execute(statement.returning(*returning)).first()
+        if row is None:
+            return None
+        mapping = row._mapping
+        if not old_values:
+            old_values = {name: mapping[f"previous_{name}"] for name in previous}
+        return self.model(**{column.key: mapping[column] for column in table.columns}), old_values
+    
+    def _delete_returning(self, entity_id: int, columns: tuple = ("id",)):
+        """DELETE one row by id and return the given columns of it, or None if it did not exist"""
+        table = self.model.__table__
+        return self.session.execute(
+            delete(table).where(table.c.id == entity_id).returning(*[table.c[name] for name in columns])
+        ).first()
+
+
+class KeysetPaginationMixin:
+    """Offset and keyset (cursor) pagination over the columns listed in cursor_columns"""
+    
+    cursor_columns: tuple = ()
+    
+    def _paginate(self, statement, skip: int, limit: int, cursor: Optional[str]):
+        """Order by the cursor columns and apply either the cursor or the offset"""
+        statement = statement.order_by(*self.cursor_columns)
+        if cursor is None:
+            return statement.offset(skip).limit(limit)
+        
+        values = decode_cursor(cursor)
+        if len(values) != len(self.cursor_columns):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        try:
+            values = [self._cursor_value(column, value) for column, value in zip(self.cursor_columns, values)]
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        if len(self.cursor_columns) == 1:
+            statement = statement.where(self.cursor_columns[0] > values[0])
+        else:
+            statement = statement.where(tuple_(*self.cursor_columns) > tuple_(*values))
+        return statement.limit(limit)
+    
+    @staticmethod
+    def _cursor_value(column, value: Any) -> Any:
+        """Convert a decoded cursor value to the column type, raising TypeError or ValueError if it does not fit"""
+        expected = column.type.python_type
+        if expected is datetime:
+            if not isinstance(value, str):
+                raise TypeError(f"{column.key} must be an ISO datetime")
+            return datetime.fromisoformat(value)
+        if isinstance(value, bool):
+            raise TypeError(f"{column.key} must be {expected.__name__}")
+        if expected is float and isinstance(value, int):
+            return float(value)
+        if not isinstance(value, expected):
+            raise TypeError(f"{column.key} must be {expected.__name__}")
+        if isinstance(value, int) and not INT64_MIN <= value <= INT64_MAX:
+            raise ValueError(f"{column.key} is out of range")
+        return value
+    
+    def next_cursor(self, items: list, limit: int) -> Optional[str]:
+        """Cursor pointing after the last item, or None when this was the last page"""
+        if len(items) < limit:
+            return None
+        return encode_cursor([getattr(items[-1], column.key) for column in self.cursor_columns])
+
 
 class PersonaRepositoryInterface(ABC):
     """Interface for Persona repository"""
@@ -15,7 +161,11 @@ class PersonaRepositoryInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Persona]:
+    def get_many(self, persona_ids: List[int]) -> List[Persona]:
+        pass
+    
+    @abstractmethod
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
         pass
     
     @abstractmethod
@@ -25,56 +175,103 @@ class PersonaRepositoryInterface(ABC):
     @abstractmethod
     def delete(self, persona_id: int) -> bool:
         pass
+    
+    @abstractmethod
+    def search_by_name(self, nombre: str, skip: int = 0, limit: int = 100) -> List[Persona]:
+        pass
+    
+    @abstractmethod
+    def get_by_id_with_pais(self, persona_id: int) -> Optional[Persona]:
+        pass
+    
+    @abstractmethod
+    def get_all_with_pais(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
+        pass
 
-class PersonaRepository(PersonaRepositoryInterface):
+class PersonaRepository(PersonaRepositoryInterface, KeysetPaginationMixin, ReturningWritesMixin):
     """Repository for Persona entity using SQLModel"""
     
+    model = Persona
+    cursor_columns = (Persona.id,)
+    
     def __init__(self, session: Session):
         self.session = session
     
     def create(self, persona: PersonaCreate) -> Persona:
         """Create a new persona"""
-        db_persona = Persona.model_validate(persona)
-        self.session.add(db_persona)
+        db_persona = self._insert_returning(persona.model_dump())
+        version = bump_table_version(self.session, Persona.__tablename__)
         self.session.commit()
-        self.session.refresh(db_persona)
+        persona_name_index.apply(version, row=db_persona)
         return db_persona
     
+    @entity_cache.cached_get(Persona)
     def get_by_id(self, persona_id: int) -> Optional[Persona]:
         """Get persona by ID"""
         statement = select(Persona).where(Persona.id == persona_id)
         return self.session.exec(statement).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Persona]:
-        """Get all personas with pagination"""
-        statement = select(Persona).offset(skip).limit(limit)
+    @entity_cache.cached_get_many(Persona)
+    def get_many(self, persona_ids: List[int]) -> List[Persona]:
+        """Get the personas with the given ids in one IN query, in the order of the ids"""
+        return select_by_ids(self.session, Persona, persona_ids)
+    
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
+        """Get all personas with pagination, by offset or after a cursor"""
+        statement = self._paginate(select(Persona), skip, limit, cursor)
         return self.session.exec(statement).all()
     
+    @entity_cache.write_through(Persona)
     def update(self, persona_id: int, persona_update: PersonaUpdate) -> Optional[Persona]:
         """Update persona by ID"""
-        db_persona = self.get_by_id(persona_id)
-        if not db_persona:
+        # Update only provided fields, never going through a cached copy
+        result = self._update_returning(persona_id, persona_update.model_dump(exclude_unset=True))
+        if result is None:
             return None
+        db_persona, _ = result
         
-        # Update only provided fields
-        persona_data = persona_update.model_dump(exclude_unset=True)
-        for key, value in persona_data.items():
-            setattr(db_persona, key, value)
-        
-        self.session.add(db_persona)
+        version = bump_table_version(self.session, Persona.__tablename__)
         self.session.commit()
-        self.session.refresh(db_persona)
+        persona_name_index.apply(version, row=db_persona)
         return db_persona
     
+    @entity_cache.invalidate(Persona)
     def delete(self, persona_id: int) -> bool:
         """Delete persona by ID"""
-        db_persona = self.get_by_id(persona_id)
-        if not db_persona:
+        if self._delete_returning(persona_id) is None:
             return False
         
-        self.session.delete(db_persona)
+        version = bump_table_version(self.session, Persona.__tablename__)
         self.session.commit()
+        persona_name_index.apply(version, deleted_id=persona_id)
         return True
+    
+    def get_by_id_with_pais(self, persona_id: int) -> Optional[Persona]:
+        """Get persona by ID with its pais loaded in the same query"""
+        statement = select(Persona).options(joinedload(Persona.pais)).where(Persona.id == persona_id)
+        return self.session.exec(statement).first()
+    
+    def get_all_with_pais(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Persona]:
+        """Get all personas with their pais loaded through a single JOIN"""
+        statement = self._paginate(select(Persona).options(joinedload(Persona.pais)), skip, limit, cursor)
+        return self.session.exec(statement).all()
+    
+    def search_by_name(self, nombre: str, skip: int = 0, limit: int = 100) -> List[Persona]:
+        """Search personas by nombre or apellido (partial match), served from the in-memory index"""
+        persona_name_index.refresh(self.session)
+        documents = persona_name_index.search(nombre)
+        if documents is not None:
+            return [Persona(**document) for document in documents[skip:skip + limit]]
+        
+        # Index over its memory budget or not loaded yet: fall back to the database
+        statement = (
+            select(Persona)
+            .where(or_(Persona.nombre.ilike(f"%{nombre}%"), Persona.apellido.ilike(f"%{nombre}%")))
+            .order_by(Persona.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        return self.session.exec(statement).all()
 
 
 class PaisRepositoryInterface(ABC):
@@ -89,7 +286,7 @@ class PaisRepositoryInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Pais]:
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Pais]:
         pass
     
     @abstractmethod
@@ -101,62 +298,79 @@ class PaisRepositoryInterface(ABC):
         pass
 
 
-class PaisRepository(PaisRepositoryInterface):
+class PaisRepository(PaisRepositoryInterface, KeysetPaginationMixin, ReturningWritesMixin):
     """Repository for Pais entity using SQLModel"""
     
+    model = Pais
+    cursor_columns = (Pais.id,)
+    
     def __init__(self, session: Session):
         self.session = session
     
     def create(self, pais: PaisCreate) -> Pais:
         """Create a new pais"""
-        db_pais = Pais.model_validate(pais)
-        self.session.add(db_pais)
+        db_pais = self._insert_returning(pais.model_dump())
+        version = bump_table_version(self.session, Pais.__tablename__)
         self.session.commit()
-        self.session.refresh(db_pais)
+        pais_cache.apply(version, row=db_pais)
         return db_pais
     
     def get_by_id(self, pais_id: int) -> Optional[Pais]:
-        """Get pais by ID"""
+        """Get pais by ID, read through the in-process pais cache"""
+        pais_cache.refresh(self.session)
+        if pais_cache.loaded:
+            cached = pais_cache.get(pais_id)
+            if cached is not None:
+                return cached
+        # Missing from the cache may only mean another worker inserted it since the last refresh
         statement = select(Pais).where(Pais.id == pais_id)
-        return self.session.exec(statement).first()
+        db_pais = self.session.exec(statement).first()
+        if db_pais is not None and pais_cache.loaded:
+            pais_cache.expire()
+        return db_pais
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Pais]:
-        """Get all paises with pagination"""
-        statement = select(Pais).offset(skip).limit(limit)
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Pais]:
+        """Get all paises with pagination, by offset or after a cursor"""
+        statement = self._paginate(select(Pais), skip, limit, cursor)
         return self.session.exec(statement).all()
     
     def update(self, pais_id: int, pais_update: PaisUpdate) -> Optional[Pais]:
         """Update pais by ID"""
-        db_pais = self.get_by_id(pais_id)
-        if not db_pais:
+        # Update only provided fields, never going through the cached copy
+        result = self._update_returning(pais_id, pais_update.model_dump(exclude_unset=True))
+        if result is None:
             return None
+        db_pais, _ = result
         
-        # Update only provided fields
-        pais_data = pais_update.model_dump(exclude_unset=True)
-        for key, value in pais_data.items():
-            setattr(db_pais, key, value)
-        
-        self.session.add(db_pais)
+        version = bump_table_version(self.session, Pais.__tablename__)
         self.session.commit()
-        self.session.refresh(db_pais)
+        pais_cache.apply(version, row=db_pais)
         return db_pais
     
     def delete(self, pais_id: int) -> bool:
         """Delete pais by ID"""
-        db_pais = self.get_by_id(pais_id)
-        if not db_pais:
+        if self._delete_returning(pais_id) is None:
             return False
         
-        self.session.delete(db_pais)
+        version = bump_table_version(self.session, Pais.__tablename__)
         self.session.commit()
+        pais_cache.apply(version, deleted_id=pais_id)
         return True
 
 
+# FTS5 table maintained by triggers on auto, see migrations.create_search_indexes
+AUTO_FTS = table("auto_fts", column("rowid"), column("auto_fts"), column("rank"))
+
+
 class AutoRepositoryInterface(ABC):
     """Interface for Auto repository"""
     
     @abstractmethod
-    def create(self, auto: AutoCreate) -> Auto:
+    def create(self, auto: AutoCreate) -> Optional[Auto]:
+        pass
+    
+    @abstractmethod
+    def upsert_by_chasis(self, numero_chasis: str, auto: AutoUpsert) -> Tuple[Auto, bool]:
         pass
     
     @abstractmethod
@@ -164,7 +378,11 @@ class AutoRepositoryInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Auto]:
+    def get_many(self, auto_ids: List[int]) -> List[Auto]:
+        pass
+    
+    @abstractmethod
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Auto]:
         pass
     
     @abstractmethod
@@ -178,62 +396,262 @@ class AutoRepositoryInterface(ABC):
     @abstractmethod
     def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
         pass
+    
+    @abstractmethod
+    def get_by_id_with_ventas(self, auto_id: int) -> Optional[Auto]:
+        pass
+    
+    @abstractmethod
+    def get_existing_chasis(self, numeros_chasis: List[str]) -> Set[str]:
+        pass
+    
+    @abstractmethod
+    def get_existing_ids(self, auto_ids: List[int]) -> Set[int]:
+        pass
+    
+    @abstractmethod
+    def create_many(self, autos: List[AutoCreate]) -> List[Auto]:
+        pass
+    
+    @abstractmethod
+    def search(
+        self,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Auto]:
+        pass
 
 
-class AutoRepository(AutoRepositoryInterface):
+class AutoRepository(AutoRepositoryInterface, KeysetPaginationMixin, ReturningWritesMixin):
     """Repository for Auto entity using SQLModel"""
     
+    model = Auto
+    cursor_columns = (Auto.id,)
+    
     def __init__(self, session: Session):
         self.session = session
     
-    def create(self, auto: AutoCreate) -> Auto:
-        """Create a new auto"""
-        db_auto = Auto.model_validate(auto)
-        self.session.add(db_auto)
+    def create(self, auto: AutoCreate) -> Optional[Auto]:
+        """Create a new auto, or return None if its numero_chasis already exists"""
+        table = Auto.__table__
+        # The unique constraint decides in the same statement, so concurrent inserts cannot race
+        statement = (
+            dialect_insert(self.session, table)
+            .values(**auto.model_dump())
+            .on_conflict_do_nothing(index_elements=[table.c.numero_chasis])
+            .returning(*table.columns)
+        )
+        row = self.session.execute(statement).first()
         self.session.commit()
-        self.session.refresh(db_auto)
-        return db_auto
+        return Auto(**row._mapping) if row is not None else None
+    
+    def upsert_by_chasis(self, numero_chasis: str, auto: AutoUpsert) -> Tuple[Auto, bool]:
+        """Insert or replace the auto with numero_chasis in one statement, returning (auto, created)"""
+        table = Auto.__table__
+        values = auto.model_dump()
+        statement = dialect_insert(self.session, table).values(numero_chasis=numero_chasis, **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.numero_chasis],
+            set_={name: statement.excluded[name] for name in values}
+        )
+        previous = table.alias("previous")
+        previous_marca = select(previous.c.marca).where(previous.c.numero_chasis == numero_chasis).scalar_subquery()
+        if self.session.get_bind().dialect.name == "postgresql":
+            # Subqueries in RETURNING see the row as it was before the statement
+            row = self.session.execute(
+                statement.returning(*table.columns, previous_marca.label("previous_marca"))
+            ).one()
+            old_marca = row.previous_marca
+        else:
+            old_marca = self.session.execute(select(previous_marca)).scalar()
+            row = self.session.execute(statement.returning(*table.columns)).one()
+        db_auto = Auto(**{column.key: row._mapping[column] for column in table.columns})
+        
+        if old_marca is not None and old_marca != db_auto.marca:
+            # The ventas of this auto move to the rollup cells of the new marca
+            venta_rollup.recompute(
+                self.session,
+                venta_rollup.cells_of_auto(self.session, db_auto.id, old_marca)
+                | venta_rollup.cells_of_auto(self.session, db_auto.id, db_auto.marca)
+            )
+        self.session.commit()
+        entity_cache.discard(Auto, db_auto.id)
+        return db_auto, old_marca is None
     
+    @entity_cache.cached_get(Auto)
     def get_by_id(self, auto_id: int) -> Optional[Auto]:
         """Get auto by ID"""
         statement = select(Auto).where(Auto.id == auto_id)
         return self.session.exec(statement).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Auto]:
-        """Get all autos with pagination"""
-        statement = select(Auto).offset(skip).limit(limit)
+    @entity_cache.cached_get_many(Auto)
+    def get_many(self, auto_ids: List[int]) -> List[Auto]:
+        """Get the autos with the given ids in one IN query, in the order of the ids"""
+        return select_by_ids(self.session, Auto, auto_ids)
+    
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Auto]:
+        """Get all autos with pagination, by offset or after a cursor"""
+        statement = self._paginate(select(Auto), skip, limit, cursor)
         return self.session.exec(statement).all()
     
+    @entity_cache.write_through(Auto)
     def update(self, auto_id: int, auto_update: AutoUpdate) -> Optional[Auto]:
         """Update auto by ID"""
-        db_auto = self.get_by_id(auto_id)
-        if not db_auto:
+        # Update only provided fields, never going through a cached copy
+        result = self._update_returning(auto_id, auto_update.model_dump(exclude_unset=True), previous=("marca",))
+        if result is None:
             return None
+        db_auto, previous = result
+        old_marca = previous["marca"]
         
-        # Update only provided fields
-        auto_data = auto_update.model_dump(exclude_unset=True)
-        for key, value in auto_data.items():
-            setattr(db_auto, key, value)
-        
-        self.session.add(db_auto)
+        if db_auto.marca != old_marca:
+            # The ventas of this auto move to the rollup cells of the new marca
+            venta_rollup.recompute(
+                self.session,
+                venta_rollup.cells_of_auto(self.session, auto_id, old_marca)
+                | venta_rollup.cells_of_auto(self.session, auto_id, db_auto.marca)
+            )
         self.session.commit()
-        self.session.refresh(db_auto)
         return db_auto
     
+    @entity_cache.invalidate(Auto)
     def delete(self, auto_id: int) -> bool:
         """Delete auto by ID"""
-        db_auto = self.get_by_id(auto_id)
-        if not db_auto:
+        deleted = self._delete_returning(auto_id, columns=("id", "marca"))
+        if deleted is None:
             return False
         
-        self.session.delete(db_auto)
+        # Ventas left behind (SQLite does not enforce the FK) drop out of the stats join, and of the rollup
+        venta_rollup.recompute(self.session, venta_rollup.cells_of_auto(self.session, auto_id, deleted.marca))
         self.session.commit()
         return True
     
+    @staticmethod
+    def export_statement():
+        """Select every auto column ordered by id, for streaming exports"""
+        return select(*Auto.__table__.columns).order_by(Auto.id)
+    
     def get_by_chasis(self, numero_chasis: str) -> Optional[Auto]:
         """Get auto by numero_chasis"""
         statement = select(Auto).where(Auto.numero_chasis == numero_chasis)
         return self.session.exec(statement).first()
+    
+    def get_by_id_with_ventas(self, auto_id: int) -> Optional[Auto]:
+        """Get auto by ID with its ventas loaded by one extra IN query"""
+        statement = select(Auto).options(selectinload(Auto.ventas)).where(Auto.id == auto_id)
+        return self.session.exec(statement).first()
+    
+    def get_existing_chasis(self, numeros_chasis: List[str]) -> Set[str]:
+        """Return which of the given numero_chasis are already stored"""
+        existing = set()
+        for start in range(0, len(numeros_chasis), IN_CLAUSE_CHUNK_SIZE):
+            chunk = numeros_chasis[start:start + IN_CLAUSE_CHUNK_SIZE]
+            statement = select(Auto.numero_chasis).where(Auto.numero_chasis.in_(chunk))
+            existing.update(self.session.exec(statement).all())
+        return existing
+    
+    def get_existing_ids(self, auto_ids: List[int]) -> Set[int]:
+        """Return which of the given auto ids exist"""
+        existing = set()
+        for start in range(0, len(auto_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = auto_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            statement = select(Auto.id).where(Auto.id.in_(chunk))
+            existing.update(self.session.exec(statement).all())
+        return existing
+    
+    def create_many(self, autos: List[AutoCreate]) -> List[Auto]:
+        """Create many autos with multi-row INSERT ... RETURNING in a single transaction"""
+        if not autos:
+            return []
+        rows = [auto.model_dump() for auto in autos]
+        # Core insert: the returned rows are not session entities, so commit cannot expire them
+        result = self.session.execute(insert(Auto.__table__).returning(*Auto.__table__.columns), rows)
+        db_autos = [Auto(**row._mapping) for row in result]
+        self.session.commit()
+        return db_autos
+    
+    def search(
+        self,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Auto]:
+        """Search autos by marca and/or modelo (partial match), best matches first"""
+        terms = {name: value for name, value in (("marca", marca), ("modelo", modelo)) if value}
+        dialect = self.session.get_bind().dialect.name
+        
+        if dialect == "sqlite":
+            statement = self._search_fts(terms)
+        else:
+            conditions = [getattr(Auto, name).ilike(f"%{value}%") for name, value in terms.items()]
+            statement = select(Auto)
+            if conditions:
+                statement = statement.where(and_(*conditions))
+            if dialect == "postgresql" and terms:
+                # ILIKE is served by the trigram indexes, similarity ranks the matches
+                rank = sum(func.similarity(getattr(Auto, name), value) for name, value in terms.items())
+                statement = statement.order_by(rank.desc(), Auto.id)
+            else:
+                statement = statement.order_by(Auto.id)
+        
+        statement = statement.offset(skip).limit(limit)
+        return self.session.exec(statement).all()
+    
+    def _search_fts(self, terms: dict):
+        """Build the search statement over the auto_fts trigram table (SQLite)"""
+        statement = select(Auto)
+        # Trigram MATCH needs at least three characters, shorter terms are filtered on auto
+        fts_terms = {name: value for name, value in terms.items() if len(value) >= 3}
+        short_terms = {name: value for name, value in terms.items() if len(value) < 3}
+        
+        for name, value in short_terms.items():
+            statement = statement.where(getattr(Auto, name).ilike(f"%{value}%"))
+        if not fts_terms:
+            return statement.order_by(Auto.id)
+        
+        query = " AND ".join(
+            f'{{{name}}}: "{value.replace(chr(34), chr(34) * 2)}"' for name, value in fts_terms.items()
+        )
+        return (
+            statement.join(AUTO_FTS, AUTO_FTS.c.rowid == Auto.id)
+            .where(AUTO_FTS.c.auto_fts.match(query))
+            .order_by(AUTO_FTS.c.rank, Auto.id)
+        )
+
+
+# Columns allowed for sorting venta search results
+VENTA_SORT_COLUMNS = {
+    "id": Venta.id,
+    "precio": Venta.precio,
+    "fecha_venta": Venta.fecha_venta,
+}
+
+# Auto columns ventas can be grouped by, through the venta -> auto join
+VENTA_STATS_AUTO_COLUMNS = {
+    "marca": Auto.marca,
+    "modelo": Auto.modelo,
+    "año": Auto.año,
+}
+
+# fecha_venta buckets as (SQLite strftime, PostgreSQL to_char) formats
+VENTA_STATS_BUCKETS = {
+    "day": ("%Y-%m-%d", "YYYY-MM-DD"),
+    "month": ("%Y-%m", "YYYY-MM"),
+    "year": ("%Y", "YYYY"),
+}
+
+# Groupings answered from venta_rollup_daily
+VENTA_ROLLUP_GROUPS = ("marca", "day", "month", "year")
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert an aware datetime to naive UTC, the form fecha_venta is stored in"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class VentaRepositoryInterface(ABC):
@@ -248,7 +666,11 @@ class VentaRepositoryInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Venta]:
+    def get_many(self, venta_ids: List[int]) -> List[Venta]:
+        pass
+    
+    @abstractmethod
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Venta]:
         pass
     
     @abstractmethod
@@ -266,58 +688,107 @@ class VentaRepositoryInterface(ABC):
     @abstractmethod
     def get_by_comprador(self, nombre: str) -> List[Venta]:
         pass
+    
+    @abstractmethod
+    def get_by_id_with_auto(self, venta_id: int) -> Optional[Venta]:
+        pass
+    
+    @abstractmethod
+    def create_many(self, ventas: List[VentaCreate]) -> int:
+        pass
+    
+    @abstractmethod
+    def search(
+        self,
+        nombre_comprador: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None,
+        auto_id: Optional[int] = None,
+        order_by: str = "id",
+        descending: bool = False,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Venta]:
+        pass
+    
+    @abstractmethod
+    def stats(
+        self,
+        group_by: str,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None
+    ) -> List[VentaStats]:
+        pass
 
 
-class VentaRepository(VentaRepositoryInterface):
+class VentaRepository(VentaRepositoryInterface, KeysetPaginationMixin, ReturningWritesMixin):
     """Repository for Venta entity using SQLModel"""
     
+    model = Venta
+    cursor_columns = (Venta.fecha_venta, Venta.id)
+    
     def __init__(self, session: Session):
         self.session = session
     
     def create(self, venta: VentaCreate) -> Venta:
         """Create a new venta"""
-        db_venta = Venta.model_validate(venta)
-        self.session.add(db_venta)
+        db_venta = self._insert_returning(venta.model_dump())
+        venta_rollup.add(self.session, [(db_venta.fecha_venta, db_venta.auto_id, db_venta.precio)])
         self.session.commit()
-        self.session.refresh(db_venta)
         return db_venta
     
+    @entity_cache.cached_get(Venta)
     def get_by_id(self, venta_id: int) -> Optional[Venta]:
         """Get venta by ID"""
         statement = select(Venta).where(Venta.id == venta_id)
         return self.session.exec(statement).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Venta]:
-        """Get all ventas with pagination"""
-        statement = select(Venta).offset(skip).limit(limit)
+    @entity_cache.cached_get_many(Venta)
+    def get_many(self, venta_ids: List[int]) -> List[Venta]:
+        """Get the ventas with the given ids in one IN query, in the order of the ids"""
+        return select_by_ids(self.session, Venta, venta_ids)
+    
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Venta]:
+        """Get all ventas with pagination, by offset or after a cursor"""
+        statement = self._paginate(select(Venta), skip, limit, cursor)
         return self.session.exec(statement).all()
     
+    @entity_cache.write_through(Venta)
     def update(self, venta_id: int, venta_update: VentaUpdate) -> Optional[Venta]:
         """Update venta by ID"""
-        db_venta = self.get_by_id(venta_id)
-        if not db_venta:
+        # Update only provided fields, never going through a cached copy
+        result = self._update_returning(
+            venta_id, venta_update.model_dump(exclude_unset=True), previous=("fecha_venta", "auto_id")
+        )
+        if result is None:
             return None
+        db_venta, previous = result
         
-        # Update only provided fields
-        venta_data = venta_update.model_dump(exclude_unset=True)
-        for key, value in venta_data.items():
-            setattr(db_venta, key, value)
-        
-        self.session.add(db_venta)
+        venta_rollup.recompute(self.session, [
+            venta_rollup.cell_of(self.session, previous["fecha_venta"], previous["auto_id"]),
+            venta_rollup.cell_of(self.session, db_venta.fecha_venta, db_venta.auto_id),
+        ])
         self.session.commit()
-        self.session.refresh(db_venta)
         return db_venta
     
+    @entity_cache.invalidate(Venta)
     def delete(self, venta_id: int) -> bool:
         """Delete venta by ID"""
-        db_venta = self.get_by_id(venta_id)
-        if not db_venta:
+        deleted = self._delete_returning(venta_id, ("fecha_venta", "auto_id"))
+        if deleted is None:
             return False
         
-        self.session.delete(db_venta)
+        venta_rollup.recompute(self.session, [venta_rollup.cell_of(self.session, deleted.fecha_venta, deleted.auto_id)])
         self.session.commit()
         return True
     
+    @staticmethod
+    def export_statement():
+        """Select every venta column ordered by id, for streaming exports"""
+        return select(*Venta.__table__.columns).order_by(Venta.id)
+    
     def get_by_auto_id(self, auto_id: int) -> List[Venta]:
         """Get ventas by auto_id"""
         statement = select(Venta).where(Venta.auto_id == auto_id)
@@ -327,3 +798,169 @@ class VentaRepository(VentaRepositoryInterface):
         """Get ventas by comprador name (partial match)"""
         statement = select(Venta).where(Venta.nombre_comprador.ilike(f"%{nombre}%"))
         return self.session.exec(statement).all()
+    
+    def get_by_id_with_auto(self, venta_id: int) -> Optional[Venta]:
+        """Get venta by ID with its auto loaded in the same query"""
+        statement = select(Venta).options(joinedload(Venta.auto)).where(Venta.id == venta_id)
+        return self.session.exec(statement).first()
+    
+    def create_many(self, ventas: List[VentaCreate]) -> int:
+        """Insert many ventas in a single transaction and return how many were stored"""
+        if not ventas:
+            return 0
+        self.session.execute(insert(Venta.__table__), [venta.model_dump() for venta in ventas])
+        venta_rollup.add(self.session, ((venta.fecha_venta, venta.auto_id, venta.precio) for venta in ventas))
+        self.session.commit()
+        return len(ventas)
+    
+    def search(
+        self,
+        nombre_comprador: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None,
+        auto_id: Optional[int] = None,
+        order_by: str = "id",
+        descending: bool = False,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Venta]:
+        """Search ventas combining all provided filters into a single SQL predicate"""
+        conditions = []
+        if nombre_comprador:
+            conditions.append(Venta.nombre_comprador.ilike(f"%{nombre_comprador}%"))
+        if precio_min is not None:
+            conditions.append(Venta.precio >= precio_min)
+        if precio_max is not None:
+            conditions.append(Venta.precio <= precio_max)
+        if fecha_desde is not None:
+            conditions.append(Venta.fecha_venta >= fecha_desde)
+        if fecha_hasta is not None:
+            conditions.append(Venta.fecha_venta <= fecha_hasta)
+        if auto_id is not None:
+            conditions.append(Venta.auto_id == auto_id)
+        
+        statement = select(Venta)
+        if conditions:
+            statement = statement.where(and_(*conditions))
+        
+        # Break ties by id so pages are stable
+        sort_columns = [VENTA_SORT_COLUMNS[order_by]]
+        if order_by != "id":
+            sort_columns.append(Venta.id)
+        if descending:
+            statement = statement.order_by(*[column.desc() for column in sort_columns])
+        else:
+            statement = statement.order_by(*[column.asc() for column in sort_columns])
+        
+        statement = statement.offset(skip).limit(limit)
+        return self.session.exec(statement).all()
+    
+    def _stats_bucket(self, bucket: str, column):
+        """Return the expression truncating a date column to a time bucket label"""
+        sqlite_format, postgres_format = VENTA_STATS_BUCKETS[bucket]
+        # Inline formats render SELECT and GROUP BY as the same expression
+        if self.session.get_bind().dialect.name == "sqlite":
+            return func.strftime(literal_column(f"'{sqlite_format}'"), column)
+        return func.to_char(column, literal_column(f"'{postgres_format}'"))
+    
+    def _raw_stats(self, group_by: str, conditions: list) -> list:
+        """Aggregate venta rows matching conditions in one GROUP BY query"""
+        if group_by in VENTA_STATS_AUTO_COLUMNS:
+            group = VENTA_STATS_AUTO_COLUMNS[group_by]
+        else:
+            group = self._stats_bucket(group_by, Venta.fecha_venta)
+        
+        statement = select(
+            group.label("group"),
+            func.count(Venta.id).label("count"),
+            func.sum(Venta.precio).label("total"),
+            func.min(Venta.precio).label("min"),
+            func.max(Venta.precio).label("max"),
+        )
+        if group_by in VENTA_STATS_AUTO_COLUMNS:
+            statement = statement.select_from(Venta).join(Auto, Auto.id == Venta.auto_id)
+        if conditions:
+            statement = statement.where(and_(*conditions))
+        return self.session.exec(statement.group_by(group)).all()
+    
+    def _rollup_stats(self, group_by: str, first_day: Optional[date], end_day: date) -> list:
+        """Aggregate the rollup cells of the days in [first_day, end_day)"""
+        if group_by == "marca":
+            group = VentaRollupDaily.marca
+        else:
+            group = self._stats_bucket(group_by, VentaRollupDaily.dia)
+        
+        statement = select(
+            group.label("group"),
+            func.sum(VentaRollupDaily.cantidad).label("count"),
+            func.sum(VentaRollupDaily.total).label("total"),
+            func.min(VentaRollupDaily.precio_min).label("min"),
+            func.max(VentaRollupDaily.precio_max).label("max"),
+        ).where(VentaRollupDaily.dia < end_day)
+        if first_day is not None:
+            statement = statement.where(VentaRollupDaily.dia >= first_day)
+        return self.session.exec(statement.group_by(group)).all()
+    
+    def stats(
+        self,
+        group_by: str,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None
+    ) -> List[VentaStats]:
+        """Aggregate precio per auto column or fecha_venta bucket.
+        
+        Groupings available in venta_rollup_daily read it for the closed days
+        fully inside the range, and scan raw venta rows only for the open day
+        and for partial days at the edges of the range.
+        """
+        fecha_desde, fecha_hasta = naive_utc(fecha_desde), naive_utc(fecha_hasta)
+        if group_by not in VENTA_ROLLUP_GROUPS:
+            conditions = []
+            if fecha_desde is not None:
+                conditions.append(Venta.fecha_venta >= fecha_desde)
+            if fecha_hasta is not None:
+                conditions.append(Venta.fecha_venta <= fecha_hasta)
+            rows = self._raw_stats(group_by, conditions)
+        else:
+            first_day = None
+            if fecha_desde is not None:
+                first_day = fecha_desde.date()
+                if fecha_desde.time() != time.min:
+                    first_day += timedelta(days=1)
+            end_day = datetime.now().date()
+            if fecha_hasta is not None:
+                end_day = min(end_day, fecha_hasta.date())
+            
+            if first_day is not None and first_day >= end_day:
+                rows = self._raw_stats(group_by, [Venta.fecha_venta >= fecha_desde] + (
+                    [Venta.fecha_venta <= fecha_hasta] if fecha_hasta is not None else []
+                ))
+            else:
+                rows = list(self._rollup_stats(group_by, first_day, end_day))
+                if first_day is not None and fecha_desde < datetime.combine(first_day, time.min):
+                    rows += self._raw_stats(group_by, [
+                        Venta.fecha_venta >= fecha_desde,
+                        Venta.fecha_venta < datetime.combine(first_day, time.min),
+                    ])
+                tail = [Venta.fecha_venta >= datetime.combine(end_day, time.min)]
+                if fecha_hasta is not None:
+                    tail.append(Venta.fecha_venta <= fecha_hasta)
+                rows += self._raw_stats(group_by, tail)
+        
+        # Merge the partial aggregates of each group
+        groups = {}
+        for row in rows:
+            merged = groups.get(row.group)
+            if merged is None:
+                groups[row.group] = {"count": row.count, "total": row.total, "min": row.min, "max": row.max}
+            else:
+                merged["count"] += row.count
+                merged["total"] += row.total
+                merged["min"] = min(merged["min"], row.min)
+                merged["max"] = max(merged["max"], row.max)
+        return [
+            VentaStats(group=group, average=values["total"] / values["count"], **values)
+            for group, values in sorted(groups.items())
+        ]
@@ -0,0 +1,39 @@
+from typing import Any, List, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from models import Auto, AutoResponseWithVentas, Pais, Persona, PersonaResponseWithPais, Venta, VentaResponseWithAuto
+from pagination import set_next_cursor
+
+# Table models expose exactly the fields of their *Response models, so rows can
+# be dumped straight to JSON bytes in one pass instead of being converted to
+# response objects, validated again against response_model and re-encoded.
+PERSONA_LIST = TypeAdapter(List[Persona])
+PAIS_LIST = TypeAdapter(List[Pais])
+AUTO_LIST = TypeAdapter(List[Auto])
+VENTA_LIST = TypeAdapter(List[Venta])
+PERSONA_WITH_PAIS_LIST = TypeAdapter(List[PersonaResponseWithPais])
+AUTO_WITH_VENTAS = TypeAdapter(AutoResponseWithVentas)
+VENTA_WITH_AUTO = TypeAdapter(VentaResponseWithAuto)
+
+
+def json_response(
+    adapter: TypeAdapter,
+    content: Any,
+    request: Optional[Request] = None,
+    next_cursor: Optional[str] = None,
+    from_attributes: bool = False
+) -> Response:
+    """Serialize entities to a JSON response in one pass with a prebuilt adapter.
+
+    With from_attributes the content is first validated into the adapter's type,
+    which is needed when the response nests relationships the table models
+    do not serialize.
+    """
+    if from_attributes:
+        content = adapter.validate_python(content, from_attributes=True)
+    response = Response(content=adapter.dump_json(content), media_type="application/json")
+    if request is not None:
+        set_next_cursor(request, response, next_cursor)
+    return response
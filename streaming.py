@@ -0,0 +1,86 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+
+# Content types of the supported export formats
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of UTF-8 byte chunks into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], format: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Parse NDJSON or CSV lines into (line_number, record, error) tuples.
+
+    CSV input must start with a header row and cannot contain line breaks inside
+    quoted fields. Empty CSV fields are left out so model defaults apply.
+    """
+    header: Optional[List[str]] = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if format == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Each line must be a JSON object"
+                continue
+            yield line_number, record, None
+        else:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield line_number, {name: value for name, value in zip(header, values) if value != ""}, None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def encode_rows(partitions: AsyncIterator[list], columns: List[str], format: str) -> AsyncIterator[bytes]:
+    """Encode batches of rows as NDJSON or CSV, one chunk of bytes per batch"""
+    if format == "csv":
+        # Header goes out before the first query result, so the first byte is immediate
+        yield (",".join(columns) + "\r\n").encode()
+    async for rows in partitions:
+        buffer = io.StringIO()
+        if format == "csv":
+            writer = csv.writer(buffer)
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in rows
+            )
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue().encode()
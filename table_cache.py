@@ -0,0 +1,97 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from sqlmodel import Session
+
+from models import TableVersion
+
+
+class VersionedTableCache(ABC):
+    """Base for in-process copies of a table kept consistent across workers.
+
+    Every repository write bumps the table's row in table_version inside its own
+    transaction and then hands the change to apply(). A change that moves the
+    version by exactly one is applied incrementally. Any gap means another
+    worker wrote in between, so the copy is rebuilt on the next refresh().
+    refresh() reads the version at most once every refresh_seconds.
+
+    Only one caller rebuilds at a time. The others keep reading the current
+    content, or their database fallback before the first load, instead of
+    waiting: in async mode they all share the event loop thread, where waiting
+    on the rebuilding caller would block it for good.
+    """
+
+    table_name: str = ""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+        self.rebuild_lock = threading.Lock()
+
+    @abstractmethod
+    def load_from(self, session: Session) -> None:
+        """Replace the cached content with the current table content"""
+        pass
+
+    @abstractmethod
+    def apply_upsert(self, row: Any) -> None:
+        pass
+
+    @abstractmethod
+    def apply_delete(self, row_id: int) -> None:
+        pass
+
+    def _db_version(self, session: Session) -> int:
+        row = session.get(TableVersion, self.table_name, populate_existing=True)
+        return row.version if row else 0
+
+    def rebuild(self, session: Session) -> None:
+        """Reload the whole table from the database"""
+        version = self._db_version(session)
+        self.load_from(session)
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def _stale(self, session: Session) -> bool:
+        """Whether the content may be older than the table, reading the version when the last check expired"""
+        if self.version is None:
+            return True
+        if time.monotonic() - self.checked_at < self.refresh_seconds:
+            return False
+        if self._db_version(session) != self.version:
+            return True
+        self.checked_at = time.monotonic()
+        return False
+
+    def refresh(self, session: Session) -> None:
+        """Rebuild if another worker changed the table since the last check"""
+        if not self._stale(session):
+            return
+        if not self.rebuild_lock.acquire(blocking=False):
+            # Another caller is rebuilding, use the current content meanwhile
+            return
+        try:
+            # The caller holding the lock before may have rebuilt already
+            if self._stale(session):
+                self.rebuild(session)
+        finally:
+            self.rebuild_lock.release()
+
+    def expire(self) -> None:
+        """Make the next refresh() read the version instead of trusting the last check"""
+        self.checked_at = 0.0
+
+    def apply(self, new_version: int, row: Any = None, deleted_id: Optional[int] = None) -> None:
+        """Apply a local write that moved the table version to new_version"""
+        if self.version is None or new_version != self.version + 1:
+            # Another worker wrote in between, rebuild on next refresh
+            self.version = None
+            return
+        if row is not None:
+            self.apply_upsert(row)
+        if deleted_id is not None:
+            self.apply_delete(deleted_id)
+        self.version = new_version
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Import time budget of the application, measured with python -X importtime.
+
+Uso: python -m unittest test_import_time
+
+Fails when importing main (the work every worker does before serving)
+gets slower than the budget, or when a driver that is only needed in some
+configurations starts being imported eagerly. The budgets can be adjusted
+for slower machines with IMPORT_BUDGET_MS and PROJECT_IMPORT_BUDGET_MS.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from typing import Dict, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Whole import of main, framework included
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+# Time spent in the modules of this repository themselves
+PROJECT_IMPORT_BUDGET_MS = float(os.getenv("PROJECT_IMPORT_BUDGET_MS", "300"))
+# Imported on demand by the configurations that need them
+LAZY_MODULES = ("asyncpg", "aiosqlite", "redis", "psycopg2")
+RUNS = 3
+
+
+def measure_imports() -> Dict[str, Tuple[int, int]]:
+    """Import main in a fresh interpreter and return module -> (self us, cumulative us)"""
+    environment = dict(os.environ, DATABASE_URL="sqlite://", OBJECTS_LOG_PATH="", OPENAPI_SCHEMA_PATH="")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_DIR,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def project_modules() -> set:
+    return {name[:-3] for name in os.listdir(PROJECT_DIR) if name.endswith(".py")}
+
+
+class ImportTimeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Best of a few runs, the first one also pays for cold file caches
+        cls.runs = [measure_imports() for _ in range(RUNS)]
+
+    def test_main_import_within_budget(self):
+        milliseconds = min(run["main"][1] for run in self.runs) / 1000
+        self.assertLessEqual(
+            milliseconds, IMPORT_BUDGET_MS,
+            f"import main took {milliseconds:.0f} ms, budget {IMPORT_BUDGET_MS:.0f} ms"
+        )
+
+    def test_project_modules_within_budget(self):
+        own = project_modules()
+        totals = [sum(times[0] for name, times in run.items() if name in own) for run in self.runs]
+        milliseconds = min(totals) / 1000
+        slowest = sorted(
+            ((times[0], name) for name, times in self.runs[0].items() if name in own), reverse=True
+        )[:5]
+        self.assertLessEqual(
+            milliseconds, PROJECT_IMPORT_BUDGET_MS,
+            f"project modules took {milliseconds:.0f} ms, budget {PROJECT_IMPORT_BUDGET_MS:.0f} ms, "
+            f"slowest: {', '.join(f'{name} {us / 1000:.0f} ms' for us, name in slowest)}"
+        )
+
+    def test_optional_drivers_are_not_imported(self):
+        imported = {name.split(".")[0] for name in self.runs[0]}
+        self.assertEqual(sorted(imported.intersection(LAZY_MODULES)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
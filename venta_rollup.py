@@ -0,0 +1,184 @@
+import argparse
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Date, cast, delete, insert, text
+from sqlmodel import Session, func, select
+
+from database import dialect_insert
+from models import Auto, Venta, VentaRollupDaily
+
+Cell = Tuple[date, str]
+
+# First key of the PostgreSQL advisory locks taken per (dia, marca) cell
+CELL_LOCK_CLASS = 7_303_017
+
+
+class VentaRollup:
+    """Maintains venta_rollup_daily inside the transaction of each venta write.
+
+    New ventas are added to their (dia, marca) cell with one upsert per cell.
+    Updates and deletes recompute the affected cells from the raw rows of that
+    day and marca, because min and max cannot be decremented. Callers flush
+    their changes first and commit afterwards.
+
+    On PostgreSQL every write locks its cells with a transaction level
+    advisory lock before touching them. A recompute then reads the venta rows
+    only after concurrent adds to the same cell have committed, and an add
+    waits for a running recompute instead of being overwritten by it.
+    """
+
+    table = VentaRollupDaily.__table__
+
+    @staticmethod
+    def day_expression(session: Session):
+        """Return the expression truncating venta.fecha_venta to a date"""
+        if session.get_bind().dialect.name == "sqlite":
+            return func.date(Venta.fecha_venta)
+        return cast(Venta.fecha_venta, Date)
+
+    def _lock_cells(self, session: Session, cells: Iterable[Cell]) -> None:
+        """Lock the cells until the end of the transaction, in a fixed order to avoid deadlocks"""
+        if session.get_bind().dialect.name != "postgresql":
+            # SQLite serializes writers on the database lock
+            return
+        for dia, marca in sorted(set(cells)):
+            session.execute(
+                text("SELECT pg_advisory_xact_lock(:lock_class, hashtext(:cell))"),
+                {"lock_class": CELL_LOCK_CLASS, "cell": f"{dia.isoformat()}|{marca}"},
+            )
+
+    def _upsert(self, session: Session, rows: List[dict]) -> None:
+        statement = dialect_insert(session, self.table)
+        if session.get_bind().dialect.name == "postgresql":
+            smallest, largest = func.least, func.greatest
+        else:
+            # SQLite min() and max() with two arguments are scalar functions
+            smallest, largest = func.min, func.max
+        columns = self.table.c
+        statement = statement.on_conflict_do_update(
+            index_elements=[columns.dia, columns.marca],
+            set_={
+                "cantidad": columns.cantidad + statement.excluded.cantidad,
+                "total": columns.total + statement.excluded.total,
+                "precio_min": smallest(columns.precio_min, statement.excluded.precio_min),
+                "precio_max": largest(columns.precio_max, statement.excluded.precio_max),
+            },
+        )
+        session.execute(statement, rows)
+
+    def add(self, session: Session, ventas: Iterable[Tuple[datetime, int, float]]) -> None:
+        """Add new ventas given as (fecha_venta, auto_id, precio) tuples"""
+        ventas = list(ventas)
+        if not ventas:
+            return
+        auto_ids = {auto_id for _, auto_id, _ in ventas}
+        marcas = dict(session.exec(select(Auto.id, Auto.marca).where(Auto.id.in_(auto_ids))).all())
+        cells: Dict[Cell, dict] = {}
+        for fecha_venta, auto_id, precio in ventas:
+            # Ventas without fecha or without an existing auto belong to no cell,
+            # as in the stats join
+            if fecha_venta is None or auto_id not in marcas:
+                continue
+            key = (fecha_venta.date(), marcas[auto_id])
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = {
+                    "dia": key[0], "marca": key[1], "cantidad": 1, "total": precio,
+                    "precio_min": precio, "precio_max": precio,
+                }
+            else:
+                cell["cantidad"] += 1
+                cell["total"] += precio
+                cell["precio_min"] = min(cell["precio_min"], precio)
+                cell["precio_max"] = max(cell["precio_max"], precio)
+        if cells:
+            self._lock_cells(session, cells)
+            self._upsert(session, [cells[key] for key in sorted(cells)])
+
+    def cell_of(self, session: Session, fecha_venta: Optional[datetime], auto_id: int) -> Optional[Cell]:
+        """Return the (dia, marca) cell a venta belongs to, None without fecha_venta"""
+        if fecha_venta is None:
+            return None
+        marca = session.exec(select(Auto.marca).where(Auto.id == auto_id)).first()
+        return (fecha_venta.date(), marca) if marca is not None else None
+
+    def cells_of_auto(self, session: Session, auto_id: int, marca: str) -> Set[Cell]:
+        """Return the cells of every venta of an auto, as if the auto had the given marca"""
+        day = self.day_expression(session)
+        days = session.exec(select(day).where(Venta.auto_id == auto_id).distinct()).all()
+        return {(date.fromisoformat(d) if isinstance(d, str) else d, marca) for d in days}
+
+    def recompute(self, session: Session, cells: Iterable[Optional[Cell]]) -> None:
+        """Rebuild the given cells from the venta rows of their day and marca"""
+        cells = sorted(set(cells) - {None})
+        # Before reading, so adds to these cells by other transactions are visible
+        self._lock_cells(session, cells)
+        for dia, marca in cells:
+            start = datetime.combine(dia, time.min)
+            row = session.exec(
+                select(
+                    func.count(Venta.id).label("cantidad"),
+                    func.sum(Venta.precio).label("total"),
+                    func.min(Venta.precio).label("precio_min"),
+                    func.max(Venta.precio).label("precio_max"),
+                )
+                .select_from(Venta)
+                .join(Auto, Auto.id == Venta.auto_id)
+                .where(
+                    Venta.fecha_venta >= start,
+                    Venta.fecha_venta < start + timedelta(days=1),
+                    Auto.marca == marca,
+                )
+            ).one()
+            session.execute(delete(self.table).where(self.table.c.dia == dia, self.table.c.marca == marca))
+            if row.cantidad:
+                session.execute(insert(self.table).values(dia=dia, marca=marca, **row._asdict()))
+
+    def rebuild(self, session: Session) -> int:
+        """Recompute the whole rollup from the venta table and return the number of cells"""
+        day = self.day_expression(session)
+        session.execute(delete(self.table))
+        session.execute(
+            insert(self.table).from_select(
+                ["dia", "marca", "cantidad", "total", "precio_min", "precio_max"],
+                select(
+                    day,
+                    Auto.marca,
+                    func.count(Venta.id),
+                    func.sum(Venta.precio),
+                    func.min(Venta.precio),
+                    func.max(Venta.precio),
+                )
+                .select_from(Venta)
+                .join(Auto, Auto.id == Venta.auto_id)
+                .group_by(day, Auto.marca),
+            )
+        )
+        session.commit()
+        return session.exec(select(func.count()).select_from(self.table)).one()
+
+    def ensure_built(self, session: Session) -> None:
+        """Build the rollup when the table is empty but ventas exist, e.g. after it was added"""
+        if session.exec(select(self.table.c.dia).limit(1)).first() is None:
+            if session.exec(select(Venta.id).limit(1)).first() is not None:
+                self.rebuild(session)
+
+
+venta_rollup = VentaRollup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the venta rollup tables")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from database import create_db_and_tables, engine
+    create_db_and_tables()
+    with Session(engine) as session:
+        cells = venta_rollup.rebuild(session)
+    print(f"venta_rollup_daily rebuilt with {cells} cells")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlmodel import Session
-from typing import List
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Literal, Optional, Union
 from datetime import datetime
-from database import get_session
-from models import VentaCreate, VentaUpdate, VentaResponse, VentaResponseWithAuto, AutoResponse
-from repository import VentaRepository, AutoRepository
+import logging
+from database import get_db_session, stream_rows
+from models import VentaCreate, VentaUpdate, VentaResponse, VentaResponseWithAuto, VentaImportError, VentaImportResponse, VentaStats
+from etag import entity_etag, etag_matches
+from streaming import EXPORT_MEDIA_TYPES, encode_rows, iter_lines, iter_records
+from pagination import parse_ids
+from responses import VENTA_LIST, VENTA_WITH_AUTO, json_response
+from repository import VentaRepository
+from async_repository import AsyncVentaRepository, AsyncAutoRepository
 
 # Create router for ventas
 router = APIRouter(prefix="/ventas", tags=["ventas"])
 
-def get_venta_repository(session: Session = Depends(get_session)) -> VentaRepository:
+# Rejected rows listed in the import summary, the rest are only counted
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+import_logger = logging.getLogger("ventas.import")
+
+async def get_venta_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncVentaRepository:
     """Dependency to get venta repository"""
-    return VentaRepository(session)
+    return AsyncVentaRepository(session)
 
-def get_auto_repository(session: Session = Depends(get_session)) -> AutoRepository:
+async def get_auto_repository(session: Union[AsyncSession, Session] = Depends(get_db_session)) -> AsyncAutoRepository:
     """Dependency to get auto repository"""
-    return AutoRepository(session)
+    return AsyncAutoRepository(session)
 
 @router.post("/", response_model=VentaResponse, status_code=status.HTTP_201_CREATED)
-def create_venta(
+async def create_venta(
     venta: VentaCreate,
-    repo: VentaRepository = Depends(get_venta_repository),
-    auto_repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncVentaRepository = Depends(get_venta_repository),
+    auto_repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> VentaResponse:
     """Create a new venta"""
     try:
-        # Validate that auto exists
-        db_auto = auto_repo.get_by_id(venta.auto_id)
-        if not db_auto:
+        # Validate that auto exists, in the database: the entity cache may lag a delete
+        if venta.auto_id not in await auto_repo.get_existing_ids([venta.auto_id]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Auto with id {venta.auto_id} not found"
@@ -40,7 +53,7 @@ def create_venta(
                 detail="Fecha de venta cannot be in the future"
             )
         
-        db_venta = repo.create(venta)
+        db_venta = await repo.create(venta)
         return VentaResponse.model_validate(db_venta)
     except HTTPException:
         raise
@@ -50,43 +63,141 @@ def create_venta(
             detail=f"Error creating venta: {str(e)}"
         )
 
+@router.post("/import", response_model=VentaImportResponse)
+async def import_ventas(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Format of the request body"),
+    chunk_size: int = Query(1000, ge=1, le=10000, description="Rows committed per transaction"),
+    repo: AsyncVentaRepository = Depends(get_venta_repository),
+    auto_repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> VentaImportResponse:
+    """Import ventas streamed as NDJSON or CSV, committing them in chunks"""
+    summary = VentaImportResponse()
+    pending = []
+    
+    def reject(line: int, detail: str) -> None:
+        summary.rejected += 1
+        # Auto rejections only surface at flush, after later lines: keep the lowest lines
+        summary.errors.append(VentaImportError(line=line, detail=detail))
+        if len(summary.errors) > IMPORT_MAX_REPORTED_ERRORS:
+            summary.errors.sort(key=lambda error: error.line)
+            summary.errors.pop()
+    
+    async def flush() -> None:
+        # One IN query validates the autos of the whole chunk
+        existing = await auto_repo.get_existing_ids(list({venta.auto_id for _, venta in pending}))
+        ventas = []
+        for line, venta in pending:
+            if venta.auto_id in existing:
+                ventas.append(venta)
+            else:
+                reject(line, f"Auto with id {venta.auto_id} not found")
+        summary.accepted += await repo.create_many(ventas)
+        summary.chunks_committed += 1
+        pending.clear()
+        import_logger.info(
+            "Venta import progress: %d accepted, %d rejected",
+            summary.accepted, summary.rejected
+        )
+    
+    async for line, record, error in iter_records(iter_lines(request.stream()), format):
+        if error is not None:
+            reject(line, error)
+            continue
+        try:
+            venta = VentaCreate.model_validate(record)
+        except ValidationError as e:
+            reject(line, str(e))
+            continue
+        if venta.fecha_venta and venta.fecha_venta > datetime.now():
+            reject(line, "Fecha de venta cannot be in the future")
+            continue
+        pending.append((line, venta))
+        if len(pending) >= chunk_size:
+            await flush()
+    
+    if pending:
+        await flush()
+    summary.errors.sort(key=lambda error: error.line)
+    return summary
+
 @router.get("/", response_model=List[VentaResponse])
-def get_ventas(
+async def get_ventas(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of ventas to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of ventas to return"),
-    repo: VentaRepository = Depends(get_venta_repository)
-) -> List[VentaResponse]:
-    """Get all ventas with pagination"""
-    ventas = repo.get_all(skip=skip, limit=limit)
-    return [VentaResponse.model_validate(venta) for venta in ventas]
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor, takes precedence over skip"),
+    ids: Optional[str] = Query(None, description="Comma separated ids fetched in one query, replaces pagination"),
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
+) -> Response:
+    """Get all ventas with offset or cursor pagination, or the ventas with the given ids"""
+    try:
+        if ids is not None:
+            return json_response(VENTA_LIST, await repo.get_many(parse_ids(ids)))
+        ventas = await repo.get_all(skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return json_response(VENTA_LIST, ventas, request, repo.next_cursor(ventas, limit))
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_ventas(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+    batch_size: int = Query(1000, ge=100, le=10000, description="Rows fetched per round trip")
+) -> StreamingResponse:
+    """Stream every venta as NDJSON or CSV from a server-side cursor"""
+    statement = VentaRepository.export_statement()
+    columns = [column.name for column in statement.selected_columns]
+    return StreamingResponse(
+        encode_rows(stream_rows(statement, batch_size), columns, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ventas.{format}"'}
+    )
+
+@router.get("/stats", response_model=List[VentaStats])
+async def get_ventas_stats(
+    group_by: Literal["marca", "modelo", "año", "day", "month", "year"] = Query(..., description="Auto column or fecha_venta bucket to group by"),
+    fecha_desde: Optional[datetime] = Query(None, description="Start date"),
+    fecha_hasta: Optional[datetime] = Query(None, description="End date"),
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
+) -> List[VentaStats]:
+    """Get count, total, average, min and max of precio per group, computed in the database"""
+    return await repo.stats(group_by=group_by, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
 
 @router.get("/{venta_id}", response_model=VentaResponse)
-def get_venta(
+async def get_venta(
     venta_id: int,
-    repo: VentaRepository = Depends(get_venta_repository)
+    request: Request,
+    response: Response,
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
 ) -> VentaResponse:
-    """Get venta by ID"""
-    db_venta = repo.get_by_id(venta_id)
+    """Get venta by ID, answering 304 when If-None-Match has the current ETag"""
+    db_venta = await repo.get_by_id(venta_id)
     if not db_venta:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Venta with id {venta_id} not found"
         )
+    etag = entity_etag(db_venta)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return VentaResponse.model_validate(db_venta)
 
 @router.put("/{venta_id}", response_model=VentaResponse)
-def update_venta(
+async def update_venta(
     venta_id: int,
     venta_update: VentaUpdate,
-    repo: VentaRepository = Depends(get_venta_repository),
-    auto_repo: AutoRepository = Depends(get_auto_repository)
+    repo: AsyncVentaRepository = Depends(get_venta_repository),
+    auto_repo: AsyncAutoRepository = Depends(get_auto_repository)
 ) -> VentaResponse:
     """Update venta by ID"""
     try:
         # Validate that auto exists if being updated
         if venta_update.auto_id:
-            db_auto = auto_repo.get_by_id(venta_update.auto_id)
-            if not db_auto:
+            if venta_update.auto_id not in await auto_repo.get_existing_ids([venta_update.auto_id]):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Auto with id {venta_update.auto_id} not found"
@@ -99,7 +210,7 @@ def update_venta(
                 detail="Fecha de venta cannot be in the future"
             )
         
-        db_venta = repo.update(venta_id, venta_update)
+        db_venta = await repo.update(venta_id, venta_update)
         if not db_venta:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -115,12 +226,12 @@ def update_venta(
         )
 
 @router.delete("/{venta_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_venta(
+async def delete_venta(
     venta_id: int,
-    repo: VentaRepository = Depends(get_venta_repository)
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
 ) -> None:
     """Delete venta by ID"""
-    success = repo.delete(venta_id)
+    success = await repo.delete(venta_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -128,90 +239,71 @@ def delete_venta(
         )
 
 @router.get("/auto/{auto_id}", response_model=List[VentaResponse])
-def get_ventas_by_auto(
+async def get_ventas_by_auto(
     auto_id: int,
-    repo: VentaRepository = Depends(get_venta_repository),
-    auto_repo: AutoRepository = Depends(get_auto_repository)
-) -> List[VentaResponse]:
+    repo: AsyncVentaRepository = Depends(get_venta_repository),
+    auto_repo: AsyncAutoRepository = Depends(get_auto_repository)
+) -> Response:
     """Get ventas by auto_id"""
     # Validate that auto exists
-    db_auto = auto_repo.get_by_id(auto_id)
+    db_auto = await auto_repo.get_by_id(auto_id)
     if not db_auto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Auto with id {auto_id} not found"
         )
     
-    ventas = repo.get_by_auto_id(auto_id)
-    return [VentaResponse.model_validate(venta) for venta in ventas]
+    ventas = await repo.get_by_auto_id(auto_id)
+    return json_response(VENTA_LIST, ventas)
 
 @router.get("/comprador/{nombre}", response_model=List[VentaResponse])
-def get_ventas_by_comprador(
+async def get_ventas_by_comprador(
     nombre: str,
-    repo: VentaRepository = Depends(get_venta_repository)
-) -> List[VentaResponse]:
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
+) -> Response:
     """Get ventas by comprador name (partial match)"""
-    ventas = repo.get_by_comprador(nombre)
-    return [VentaResponse.model_validate(venta) for venta in ventas]
+    ventas = await repo.get_by_comprador(nombre)
+    return json_response(VENTA_LIST, ventas)
 
 @router.get("/{venta_id}/with-auto", response_model=VentaResponseWithAuto)
-def get_venta_with_auto(
+async def get_venta_with_auto(
     venta_id: int,
-    repo: VentaRepository = Depends(get_venta_repository),
-    auto_repo: AutoRepository = Depends(get_auto_repository)
-) -> VentaResponseWithAuto:
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
+) -> Response:
     """Get venta by ID with auto information included"""
-    db_venta = repo.get_by_id(venta_id)
+    db_venta = await repo.get_by_id_with_auto(venta_id)
     if not db_venta:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Venta with id {venta_id} not found"
         )
-    
-    # Get auto information
-    db_auto = auto_repo.get_by_id(db_venta.auto_id)
-    
-    venta_dict = VentaResponseWithAuto.model_validate(db_venta).model_dump()
-    
-    if db_auto:
-        venta_dict['auto'] = AutoResponse.model_validate(db_auto).model_dump()
-    
-    return VentaResponseWithAuto.model_validate(venta_dict)
+    return json_response(VENTA_WITH_AUTO, db_venta, from_attributes=True)
 
 @router.get("/search/", response_model=List[VentaResponse])
-def search_ventas(
+async def search_ventas(
     nombre_comprador: str = Query(None, min_length=2, description="Comprador name to search for"),
     precio_min: float = Query(None, ge=0, description="Minimum price"),
     precio_max: float = Query(None, ge=0, description="Maximum price"),
     fecha_desde: datetime = Query(None, description="Start date"),
     fecha_hasta: datetime = Query(None, description="End date"),
-    repo: VentaRepository = Depends(get_venta_repository)
-) -> List[VentaResponse]:
+    auto_id: int = Query(None, description="Auto ID"),
+    order_by: Literal["id", "precio", "fecha_venta"] = Query("id", description="Field to sort by"),
+    descending: bool = Query(False, description="Sort in descending order"),
+    skip: int = Query(0, ge=0, description="Number of ventas to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of ventas to return"),
+    repo: AsyncVentaRepository = Depends(get_venta_repository)
+) -> Response:
     """Search ventas by various filters"""
-    # This would require additional repository method for complex search
-    # For now, we'll get all and filter in Python (not efficient for large datasets)
-    all_ventas = repo.get_all(limit=1000)
-    filtered_ventas = []
-    
-    for venta in all_ventas:
-        # Filter by nombre_comprador
-        nombre_match = not nombre_comprador or nombre_comprador.lower() in venta.nombre_comprador.lower()
-        
-        # Filter by price range
-        precio_match = True
-        if precio_min is not None and venta.precio < precio_min:
-            precio_match = False
-        if precio_max is not None and venta.precio > precio_max:
-            precio_match = False
-        
-        # Filter by date range
-        fecha_match = True
-        if fecha_desde and venta.fecha_venta < fecha_desde:
-            fecha_match = False
-        if fecha_hasta and venta.fecha_venta > fecha_hasta:
-            fecha_match = False
-        
-        if nombre_match and precio_match and fecha_match:
-            filtered_ventas.append(venta)
-    
-    return [VentaResponse.model_validate(venta) for venta in filtered_ventas]
+    ventas = await repo.search(
+        nombre_comprador=nombre_comprador,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        auto_id=auto_id,
+        order_by=order_by,
+        descending=descending,
+        skip=skip,
+        limit=limit
+    )
+    return json_response(VENTA_LIST, ventas)